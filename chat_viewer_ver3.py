@@ -1,14 +1,32 @@
 import time
 import os
 import sys
-import json
+import re
+import queue
+import asyncio
 import tkinter as tk
 from tkinter import scrolledtext, Listbox, filedialog, colorchooser
-from bs4 import BeautifulSoup
 import threading
-from collections import OrderedDict
-from ctypes import windll
+from bisect import bisect_left
+
+# クリック透過は Windows のみ
+try:
+    from ctypes import windll
+except ImportError:
+    windll = None
+
 import tkinter.ttk as ttk
+from twchat import (
+    ARCHIVE_DIR, BUDGET_MS, BULK, CHAT_COLORS, CHAT_ORDER, DEFAULT_ALERT_RULES, DEFAULT_FOLDER,
+    EXCLUDE_LABELS, EXCLUDE_PATTERNS, FLOOD_BURST, FLOOD_RATE, FRAME_MS, GAIN_KINDS,
+    HANDOFF_TIMEOUT, HOT_WINDOW, LOOT_KINDS, OVERLAY_PORT, PRIORITY, REPEAT_CHANNELS, REPEAT_WINDOW,
+    ActivityTimeline, AlertEngine, AlertRule, Backoff, BinaryLogReader, BinaryLogWriter, ChatQuery,
+    Classifier, FloodGuard, FlushController, FrameBudget, HotTracker, IngestCore, LootTracker,
+    MessageStore, OverlayServer, RateTracker, ReaderService, RenderLanes, RepeatCollapser,
+    SessionColumns, UiDispatcher,
+    compact_old_days, downsample_max, downsample_minmax, format_clock, load_settings, parse_clock,
+    parse_gain, parse_loot, save_settings, session_stats, split_speaker,
+)
 
 # ============================================================
 #   リソースパス取得
@@ -19,49 +37,57 @@ def resource_path(filename):
     return filename
 
 # ============================================================
-#   設定ファイル.json
+#   チャット色設定（定義は twchat.channels）
 # ============================================================
-SETTINGS_FILE = "settings.json"
-
-def load_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        return {}
-    try:
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
+chat_colors = CHAT_COLORS
+chat_order = CHAT_ORDER
 
-def save_settings(data):
-    try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-    except:
-        print("設定保存エラー")
+# 大量の発言に埋もれないよう、次のフレームで描く種別
+PRIORITY_CHANNELS = ("耳打ち",)
 
 # ============================================================
-#   チャット色設定
+#   テキスト欄の行 ↔ メッセージ番号
 # ============================================================
-chat_colors = OrderedDict({
-    "#c8ffc8": ("一般", "white"),
-    "#ffffff": ("一般", "white"),
-    "#64ff64": ("耳打ち", "green"),
-    "#f7b73c": ("チーム", "orange"),
-    "#94ddfa": ("クラブ", "cyan"),
-    "#ff64ff": ("システム", "#FFD56B"),
-    "#c896c8": ("叫ぶ", "violet")
-})
-
-chat_order = ["一般", "耳打ち", "チーム", "クラブ", "システム", "叫ぶ"]
-
-EXCLUDE_LABELS = {
-    "経験値が": "取得経験値",
-    "ルーン経験値が": "取得ルーン経験値",
-    "[ELSO": "取得ELSO",
-    "ペットが": "ペット取得"
-}
-
-EXCLUDE_PATTERNS = list(EXCLUDE_LABELS.keys())
+#   1メッセージ = 1行。表示中のメッセージ番号を昇順に持っておけば、
+#   行番号は二分探索で求まる（全体を再描画せずに行を差し込み・削除できる）
+class LineIndex:
+    def __init__(self):
+        self.seqs = []
+
+    def clear(self):
+        self.seqs.clear()
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def line_of(self, seq):
+        i = bisect_left(self.seqs, seq)
+        if i < len(self.seqs) and self.seqs[i] == seq:
+            return i + 1
+        return None
+
+    def line_from(self, seq):
+        # seq 以降で最初に表示している行
+        i = bisect_left(self.seqs, seq)
+        if i < len(self.seqs):
+            return i + 1
+        return None
+
+    def seq_at(self, line):
+        if 1 <= line <= len(self.seqs):
+            return self.seqs[line - 1]
+        return None
+
+    def insert(self, seq):
+        i = bisect_left(self.seqs, seq)
+        self.seqs.insert(i, seq)
+        return i + 1
+
+    def remove(self, seq):
+        line = self.line_of(seq)
+        if line is not None:
+            del self.seqs[line - 1]
+        return line
 
 # ============================================================
 #   ChatViewer ver3
@@ -111,6 +137,8 @@ class ChatViewerVer3:
             self.exclude_options[pat] = tk.BooleanVar(
                 value=saved_exclude.get(pat, False)
             )
+        # 取り込みスレッドは BooleanVar を読まずにこちらを見る（非表示にする行頭）
+        self.hidden_prefixes = tuple(pat for pat in EXCLUDE_PATTERNS if not saved_exclude.get(pat, False))
 
         # Notebook
         self.notebook = ttk.Notebook(self.root)
@@ -120,21 +148,100 @@ class ChatViewerVer3:
         self.tab_view = tk.Frame(self.notebook, bg="#0D1117")
         self.notebook.add(self.tab_view, text="ビュー")
 
+        # 分析タブ
+        self.tab_analytics = tk.Frame(self.notebook, bg="#0D1117")
+        self.notebook.add(self.tab_analytics, text="分析")
+
         # 設定タブ（スクロール対応）
         self.tab_settings = tk.Frame(self.notebook, bg="#0D1117")
         self.notebook.add(self.tab_settings, text="設定")
 
+        # 診断タブ
+        self.tab_diagnostics = tk.Frame(self.notebook, bg="#0D1117")
+        self.notebook.add(self.tab_diagnostics, text="診断")
+        self.diagnostics_job = None
+
         # 共通状態
-        self.base_folder = self.settings.get(
-            "folder", "C:\\Nexon\\TalesWeaver\\ChatLog"
-        )
+        self.base_folder = self.settings.get("folder", DEFAULT_FOLDER)
         self.monitoring = False
-        self.messages = []
+        self.backoff = Backoff()
+        self.reader = ReaderService(run_reader)
+
+        # その日のバイナリログのうち、取り込み済みの件数（読み込みを再開しても二重にしない）
+        self.history_day = None
+        self.history_count = 0
+        self.messages = MessageStore()
+        self.speaker_filter = ""
+        self.time_range = None
+
+        # 経験値 / ルーン経験値の時速（直近60分）
+        self.gains = RateTracker()
+        self.rates_job = None
+
+        # ELSO / ペット拾得の内訳（チャット欄には出さず取得パネルに集計）
+        self.loot = LootTracker()
+
+        # セッション集計（分析タブ）
+        self.session = SessionColumns(chat_order)
+        self.hot = HotTracker()
+        self.analytics_job = None
+
+        # 発言量タイムライン（ビュー上部）
+        self.timeline = ActivityTimeline(chat_order)
+        self.timeline_drawn = -1
+
+        # 時速とタイムラインは取り込みがあったときだけ描き直す（予約は1秒に1回まで）
+        self.stats_lock = threading.Lock()
+        self.stats_pending = False
+
+        # 繰り返しメッセージのまとめ
+        self.repeat_window = tk.IntVar(value=self.settings.get("repeat_window", REPEAT_WINDOW))
+        saved_repeat = self.settings.get("repeat_channels", list(REPEAT_CHANNELS))
+        self.repeat_channels = {
+            chat_type: tk.BooleanVar(value=chat_type in saved_repeat) for chat_type in chat_order
+        }
+        self.repeats = RepeatCollapser(self.repeat_window.get(), saved_repeat)
+
+        # 連投の省略（発言者ごと）
+        self.flood_rate = tk.IntVar(value=self.settings.get("flood_rate", FLOOD_RATE))
+        self.flood_burst = tk.IntVar(value=self.settings.get("flood_burst", FLOOD_BURST))
+        self.flood = FloodGuard(self.flood_rate.get(), self.flood_burst.get())
+
+        # 通知ルール（取り込みスレッドで判定し、UIには結果だけを渡す）
+        self.alerts = AlertEngine(self.load_alert_rules())
+        self.alert_events = queue.SimpleQueue()
+        self.alert_lock = threading.Lock()
+        self.alert_pending = False
+        self.alert_count = 0
+        self.alert_seq = None
 
         # NG/SP
         self.ng_words = self.settings.get("ng_words", [])
         self.sp_words = self.settings.get("sp_words", [])
 
+        # 発言者ミュート / 常時表示
+        self.muted_speakers = set(self.settings.get("muted_speakers", []))
+        self.pinned_speakers = set(self.settings.get("pinned_speakers", []))
+        self.main_lines = LineIndex()
+        self.compact_lines = LineIndex()
+
+        # 取り込み → 画面（優先 / 通常の2レーン）。描画の予約は dispatcher が出す
+        self.render_lanes = RenderLanes()
+        self.flush_control = FlushController()
+        self.dispatcher = UiDispatcher(self.root.after)
+
+        # CPU節約モード（重い処理を1フレームあたり budget_ms までに区切る）
+        self.budget_mode = tk.BooleanVar(value=self.settings.get("budget_mode", False))
+        self.budget_ms = tk.IntVar(value=self.settings.get("budget_ms", BUDGET_MS))
+        self.budget = FrameBudget(self.budget_ms.get(), self.budget_mode.get())
+
+        # オーバーレイ配信（ブラウザ / OBS）
+        self.overlay_enabled = tk.BooleanVar(value=self.settings.get("overlay_enabled", False))
+        self.overlay_port = tk.IntVar(value=self.settings.get("overlay_port", OVERLAY_PORT))
+        self.overlay = OverlayServer(port=self.overlay_port.get())
+        self.overlay_frames = []
+        self.sliced_jobs = {}
+
         # 表示切替
         self.show_time = tk.BooleanVar(value=self.settings.get("show_time", True))
         self.show_label = tk.BooleanVar(value=self.settings.get("show_label", True))
@@ -155,9 +262,15 @@ class ChatViewerVer3:
 
         # UI構築
         self.build_view_tab()
+        self.build_analytics_tab()
         self.build_settings_tab()
+        self.build_diagnostics_tab()
 
         self.status_label.config(text="停止中", fg="#3A6EA5")
+        self.update_rates()
+        self.update_timeline()
+        if self.overlay_enabled.get():
+            self.apply_overlay_settings(save=False)
 
     # ============================================================
     #   ビュータブ
@@ -188,6 +301,18 @@ class ChatViewerVer3:
         )
         self.status_label.pack(side="left", padx=15)
 
+        # 通知バッジ（クリックで最後に通知した行へ）
+        self.alert_badge = tk.Label(
+            top_frame,
+            text="",
+            bg="#0D1117",
+            fg="#FF6B6B",
+            cursor="hand2",
+            font=("Meiryo", 10, "bold")
+        )
+        self.alert_badge.pack(side="left", padx=5)
+        self.alert_badge.bind("<Button-1>", lambda e: self.show_last_alert())
+
         # コンパクトクリック透過チェックボックス（ビュータブへ移動）
         tk.Checkbutton(
             top_frame,
@@ -243,6 +368,15 @@ class ChatViewerVer3:
             )
             cb.pack(side="left", padx=5)
 
+        self.rate_label = tk.Label(
+            filter_frame,
+            text="",
+            bg="#0D1117",
+            fg="#FFD56B",
+            font=("Meiryo", 9)
+        )
+        self.rate_label.pack(side="right", padx=10)
+
         # 検索バー
         search_frame = tk.Frame(main_frame, bg="#0D1117")
         search_frame.pack(fill="x", pady=0, padx=5)
@@ -277,14 +411,129 @@ class ChatViewerVer3:
             font=("Meiryo", 7)
         ).pack(side="left", pady=3, padx=1)
 
+        # 発言者で絞り込み
+        tk.Label(search_frame, text="発言者:", bg="#0D1117", fg="white").pack(side="left", padx=(10, 0))
+
+        self.speaker_entry = tk.Entry(
+            search_frame, width=12,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        self.speaker_entry.pack(side="left", pady=0, padx=5)
+        self.speaker_entry.bind("<Return>", lambda e: self.apply_speaker_filter())
+
+        tk.Button(
+            search_frame, text="絞込",
+            command=self.apply_speaker_filter,
+            bg="#1F2A44", fg="white",
+            height=1,
+            pady=0,
+            borderwidth=1,
+            highlightthickness=1,
+            font=("Meiryo", 7)
+        ).pack(side="left", pady=3, padx=1)
+
+        # 時刻へ移動 / 時刻範囲
+        time_frame = tk.Frame(main_frame, bg="#0D1117")
+        time_frame.pack(fill="x", pady=0, padx=5)
+
+        tk.Label(time_frame, text="時刻:", bg="#0D1117", fg="white").pack(side="left")
+
+        self.jump_entry = tk.Entry(
+            time_frame, width=8,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        self.jump_entry.pack(side="left", pady=0, padx=5)
+        self.jump_entry.bind("<Return>", lambda e: self.jump_to_time())
+
+        tk.Button(
+            time_frame, text="移動",
+            command=self.jump_to_time,
+            bg="#1F2A44", fg="white",
+            height=1,
+            pady=0,
+            borderwidth=1,
+            highlightthickness=1,
+            font=("Meiryo", 7)
+        ).pack(side="left", pady=3, padx=1)
+
+        tk.Label(time_frame, text="範囲:", bg="#0D1117", fg="white").pack(side="left", padx=(10, 0))
+
+        self.range_start_entry = tk.Entry(
+            time_frame, width=8,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        self.range_start_entry.pack(side="left", pady=0, padx=5)
+
+        tk.Label(time_frame, text="〜", bg="#0D1117", fg="white").pack(side="left")
+
+        self.range_end_entry = tk.Entry(
+            time_frame, width=8,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        self.range_end_entry.pack(side="left", pady=0, padx=5)
+
+        for text, command in (("適用", self.apply_time_range), ("解除", self.clear_time_range)):
+            tk.Button(
+                time_frame, text=text,
+                command=command,
+                bg="#1F2A44", fg="white",
+                height=1,
+                pady=0,
+                borderwidth=1,
+                highlightthickness=1,
+                font=("Meiryo", 7)
+            ).pack(side="left", pady=3, padx=1)
+
+        # 画面に残っていない時刻へ移動したときは、履歴で見つかった行をここに出す
+        self.jump_status = tk.Label(time_frame, text="", bg="#0D1117", fg="#AAAAAA", font=("Meiryo", 8))
+        self.jump_status.pack(side="left", padx=5)
+
+        # 発言量タイムライン（クリックでその時刻へ移動）
+        self.timeline_canvas = tk.Canvas(
+            main_frame, height=36,
+            bg="#000000", highlightthickness=0, cursor="hand2"
+        )
+        self.timeline_canvas.pack(fill="x", pady=(3, 0))
+        self.timeline_canvas.bind("<Button-1>", self.on_timeline_click)
+        self.timeline_canvas.bind("<Configure>", lambda e: self.draw_timeline())
+
+        body_frame = tk.Frame(main_frame, bg="#0D1117")
+        body_frame.pack(fill="both", expand=True)
+
+        # 取得パネル（ELSO / ペット拾得）
+        loot_frame = tk.LabelFrame(body_frame, text="取得", bg="#0D1117", fg="white")
+        loot_frame.pack(side="right", fill="y", padx=(5, 0))
+
+        self.loot_label = tk.Label(
+            loot_frame,
+            text="",
+            bg="#0D1117",
+            fg="#FFD56B",
+            justify="left",
+            font=("Meiryo", 9)
+        )
+        self.loot_label.pack(anchor="w", padx=5, pady=2)
+
+        self.loot_listbox = tk.Listbox(
+            loot_frame, width=26,
+            bg="#000000", fg="white",
+            font=("MS Gothic", 9)
+        )
+        self.loot_listbox.pack(fill="y", expand=True, padx=5, pady=(0, 5))
+
+        tk.Button(
+            loot_frame, text="リセット", command=self.reset_loot,
+            bg="#1F2A44", fg="white", font=("Meiryo", 7)
+        ).pack(pady=(0, 5))
+
         # メインテキスト
         self.text_area = scrolledtext.ScrolledText(
-            main_frame, width=80, height=35,
+            body_frame, width=80, height=35,
             bg="#000000", fg="white",
             insertbackground="white",
             font=("MS Gothic", 10)
         )
-        self.text_area.pack(fill="both", expand=True)
+        self.text_area.pack(side="left", fill="both", expand=True)
 
         for ctype in chat_order:
             color = self.chat_display_colors.get(ctype, "white")
@@ -293,6 +542,184 @@ class ChatViewerVer3:
         self.text_area.tag_config("search_highlight", background="#FFD56B", foreground="black")
         self.search_index = "1.0"
 
+        # 右クリックで発言者をミュート / 常時表示
+        self.speaker_menu = tk.Menu(self.root, tearoff=0)
+        self.text_area.bind("<Button-3>", self.show_speaker_menu)
+
+    # ============================================================
+    #   分析タブ
+    # ============================================================
+    def build_analytics_tab(self):
+        frame = self.tab_analytics
+
+        top_frame = tk.Frame(frame, bg="#0D1117")
+        top_frame.pack(fill="x", pady=5)
+
+        tk.Button(
+            top_frame, text="更新", command=self.refresh_analytics,
+            bg="#1F2A44", fg="white"
+        ).pack(side="left", padx=5)
+
+        tk.Button(
+            top_frame, text="リセット", command=self.reset_analytics,
+            bg="#1F2A44", fg="white"
+        ).pack(side="left", padx=5)
+
+        self.analytics_label = tk.Label(
+            frame,
+            text="",
+            bg="#0D1117",
+            fg="white",
+            justify="left",
+            font=("Meiryo", 9)
+        )
+        self.analytics_label.pack(anchor="w", padx=5, pady=(0, 5))
+
+        tk.Label(frame, text="種別ごとの発言数 / 分", bg="#0D1117", fg="white",
+                 font=("Meiryo", 9)).pack(anchor="w", padx=5)
+        self.channel_chart = tk.Canvas(frame, height=180, bg="#000000", highlightthickness=0)
+        self.channel_chart.pack(fill="x", padx=5, pady=(0, 5))
+
+        tk.Label(frame, text="経験値 / 時（黄）・ルーン経験値 / 時（紫）  直近60分", bg="#0D1117", fg="white",
+                 font=("Meiryo", 9)).pack(anchor="w", padx=5)
+        self.exp_chart = tk.Canvas(frame, height=140, bg="#000000", highlightthickness=0)
+        self.exp_chart.pack(fill="x", padx=5, pady=(0, 5))
+
+        # いま話題（発言者・単語）
+        hot_frame = tk.LabelFrame(frame, text=f"いま話題（直近{HOT_WINDOW}分・叫ぶ / 一般）",
+                                  bg="#0D1117", fg="white")
+        hot_frame.pack(fill="both", expand=True, padx=5, pady=5)
+
+        self.hot_listboxes = {}
+        for key, text in (("speakers", "よく発言している人"), ("words", "盛り上がっている単語")):
+            sub = tk.Frame(hot_frame, bg="#0D1117")
+            sub.pack(side="left", fill="both", expand=True, padx=5)
+            tk.Label(sub, text=text, bg="#0D1117", fg="white", font=("Meiryo", 9)).pack(anchor="w")
+            listbox = Listbox(sub, height=10, bg="#000000", fg="white", font=("MS Gothic", 9))
+            listbox.pack(fill="both", expand=True, pady=(0, 5))
+            self.hot_listboxes[key] = listbox
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def on_tab_changed(self, event=None):
+        self.refresh_stats()
+        self.refresh_analytics()
+        self.refresh_diagnostics()
+
+    def reset_analytics(self):
+        # 取り込みスレッドの追記とはロックで順番を揃える（待たずに次のフレームでやり直す）
+        if not self.reader.lock.acquire(blocking=False):
+            self.root.after(FRAME_MS, self.reset_analytics)
+            return
+        try:
+            self.session.clear()
+            self.hot.clear()
+        finally:
+            self.reader.lock.release()
+        self.refresh_analytics()
+
+    def refresh_hot(self):
+        # スケッチは取り込みスレッドが書き換えるのでロック中に読む（取り込み中ならこの回は飛ばす）
+        if not self.reader.lock.acquire(blocking=False):
+            return
+        try:
+            now = time.localtime()
+            now_secs = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+            top = self.hot.top_speakers(now_secs)
+            trending = self.hot.trending_words(now_secs)
+        finally:
+            self.reader.lock.release()
+        rows = {
+            "speakers": [f"{name}  {count:,}" for name, count in top],
+            "words": [
+                f"{word}  {count:,}" + ("  ↑" if lift >= 2 else "")
+                for word, count, lift in trending
+            ],
+        }
+        for key, listbox in self.hot_listboxes.items():
+            listbox.delete(0, tk.END)
+            for row in rows[key]:
+                listbox.insert(tk.END, row)
+
+    def refresh_analytics(self):
+        if self.analytics_job is not None:
+            self.root.after_cancel(self.analytics_job)
+            self.analytics_job = None
+
+        # 分析タブを開いている間だけ5秒ごとに更新
+        if self.notebook.select() != str(self.tab_analytics):
+            return
+        self.analytics_job = self.root.after(5000, self.refresh_analytics)
+        self.run_sliced("analytics", self.analytics_steps())
+
+    def analytics_steps(self):
+        # 集計とグラフごとに区切る（CPU節約モードではフレームをまたいで進める）
+        self.refresh_hot()
+        yield
+
+        start = time.perf_counter()
+        try:
+            stats = session_stats(self.session)
+        except RuntimeError as e:
+            self.analytics_label.config(text=f"{e}（pip install numpy）")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if stats is None:
+            self.analytics_label.config(text="まだデータがありません")
+            return
+        yield
+
+        exp_i = GAIN_KINDS.index("exp")
+        rune_i = GAIN_KINDS.index("rune")
+
+        self.draw_chart(self.channel_chart, stats, [
+            (stats.channel_counts[:, i], self.chat_display_colors.get(ct, "white"))
+            for i, ct in enumerate(stats.channels)
+        ])
+        yield
+        self.draw_chart(self.exp_chart, stats, [
+            (stats.per_hour[:, exp_i], "#FFD56B"),
+            (stats.per_hour[:, rune_i], "violet"),
+        ])
+        yield
+
+        rates = "  ".join(
+            f"{ct} {rate:.1f}" for ct, rate in zip(stats.channels, stats.channel_rates)
+        )
+        self.analytics_label.config(text="\n".join([
+            f"経過 {stats.minutes}分（集計 {elapsed:.1f}ms）",
+            f"発言/分: {rates}",
+            f"経験値: 合計 {stats.totals['exp']:,}  時速 {stats.hourly['exp']:,.0f}"
+            f"　ルーン経験値: 合計 {stats.totals['rune']:,}  時速 {stats.hourly['rune']:,.0f}",
+            f"ELSO: 合計 {stats.totals['elso']:,}  時速 {stats.hourly['elso']:,.0f}"
+            f"　ペット拾得: {stats.totals['pet']:,}件  時速 {stats.hourly['pet']:,.1f}件",
+        ]))
+
+    def draw_chart(self, canvas, stats, series):
+        canvas.delete("all")
+        width = max(canvas.winfo_width(), 2)
+        height = max(canvas.winfo_height(), 20)
+
+        sampled = [(downsample_max(values, width), color) for values, color in series]
+        peak = max((float(ys.max()) for ys, _ in sampled if len(ys)), default=0) or 1
+
+        for ys, color in sampled:
+            n = len(ys)
+            if n < 2:
+                continue
+            coords = []
+            for i, v in enumerate(ys.tolist()):
+                coords.append(i * (width - 1) / (n - 1))
+                coords.append(height - 14 - v / peak * (height - 28))
+            canvas.create_line(*coords, fill=color)
+
+        canvas.create_text(4, 2, anchor="nw", text=f"{peak:,.0f}", fill="gray", font=("Meiryo", 7))
+        canvas.create_text(4, height - 1, anchor="sw", fill="gray", font=("Meiryo", 7),
+                           text=format_clock(stats.start_minute * 60))
+        canvas.create_text(width - 4, height - 1, anchor="se", fill="gray", font=("Meiryo", 7),
+                           text=format_clock((stats.start_minute + stats.minutes - 1) * 60))
+
     # ============================================================
     #   設定タブ（スクロール対応）
     # ============================================================
@@ -433,13 +860,191 @@ class ChatViewerVer3:
                 frame_exclude,
                 text=label,
                 variable=self.exclude_options[pat],
-                command=self.save_current_settings,
+                command=self.apply_exclude_settings,
                 bg="#0D1117",
                 fg="white",
                 selectcolor="#0D1117",
                 font=("Meiryo", 10)
             ).pack(anchor="w", pady=2)
 
+        # 繰り返しメッセージをまとめる
+        frame_repeat = tk.LabelFrame(frame, text="繰り返しメッセージをまとめる ※同じ内容を1行にして ×N を表示",
+                                     bg="#0D1117", fg="white")
+        frame_repeat.pack(fill="x", padx=10, pady=10)
+
+        row = tk.Frame(frame_repeat, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=2)
+
+        tk.Label(row, text="まとめる時間（秒、0で無効）:", bg="#0D1117", fg="white").pack(side="left")
+
+        spin = tk.Spinbox(
+            row, from_=0, to=3600, increment=30, width=6,
+            textvariable=self.repeat_window,
+            command=self.apply_repeat_settings,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        spin.pack(side="left", padx=5)
+        spin.bind("<Return>", lambda e: self.apply_repeat_settings())
+        spin.bind("<FocusOut>", lambda e: self.apply_repeat_settings())
+
+        row = tk.Frame(frame_repeat, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=2)
+
+        for chat_type in chat_order:
+            tk.Checkbutton(
+                row,
+                text=chat_type,
+                variable=self.repeat_channels[chat_type],
+                command=self.apply_repeat_settings,
+                bg="#0D1117",
+                fg=self.chat_display_colors.get(chat_type, "white"),
+                selectcolor="#0D1117",
+                font=("Meiryo", 10)
+            ).pack(side="left", padx=5)
+
+        # 連投の省略
+        frame_flood = tk.LabelFrame(frame, text="連投の省略（一般・叫ぶ） ※超えた分は1行の「省略」にまとめる",
+                                    bg="#0D1117", fg="white")
+        frame_flood.pack(fill="x", padx=10, pady=10)
+
+        row = tk.Frame(frame_flood, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=2)
+
+        for text, var, limit in (("1分あたり（0で無効）:", self.flood_rate, 600),
+                                 ("連続:", self.flood_burst, 100)):
+            tk.Label(row, text=text, bg="#0D1117", fg="white").pack(side="left", padx=(0, 2))
+            spin = tk.Spinbox(
+                row, from_=0, to=limit, width=5,
+                textvariable=var,
+                command=self.apply_flood_settings,
+                bg="#000000", fg="white", insertbackground="white"
+            )
+            spin.pack(side="left", padx=(0, 10))
+            spin.bind("<Return>", lambda e: self.apply_flood_settings())
+            spin.bind("<FocusOut>", lambda e: self.apply_flood_settings())
+
+        # CPU節約モード
+        frame_budget = tk.LabelFrame(frame, text="CPU節約モード ※再描画などを小分けにしてゲームのカクつきを抑える",
+                                     bg="#0D1117", fg="white")
+        frame_budget.pack(fill="x", padx=10, pady=10)
+
+        row = tk.Frame(frame_budget, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=2)
+
+        tk.Checkbutton(
+            row,
+            text="有効",
+            variable=self.budget_mode,
+            command=self.apply_budget_settings,
+            bg="#0D1117",
+            fg="white",
+            selectcolor="#0D1117",
+            font=("Meiryo", 10)
+        ).pack(side="left")
+
+        tk.Label(row, text="1フレームあたり（ミリ秒）:", bg="#0D1117", fg="white").pack(side="left", padx=(10, 2))
+
+        spin = tk.Spinbox(
+            row, from_=1, to=50, width=4,
+            textvariable=self.budget_ms,
+            command=self.apply_budget_settings,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        spin.pack(side="left")
+        spin.bind("<Return>", lambda e: self.apply_budget_settings())
+        spin.bind("<FocusOut>", lambda e: self.apply_budget_settings())
+
+        # オーバーレイ配信
+        frame_overlay = tk.LabelFrame(frame, text="オーバーレイ配信 ※ブラウザ / OBS のブラウザソースで開く（このPCからのみ）",
+                                      bg="#0D1117", fg="white")
+        frame_overlay.pack(fill="x", padx=10, pady=10)
+
+        row = tk.Frame(frame_overlay, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=2)
+
+        tk.Checkbutton(
+            row,
+            text="有効",
+            variable=self.overlay_enabled,
+            command=self.apply_overlay_settings,
+            bg="#0D1117",
+            fg="white",
+            selectcolor="#0D1117",
+            font=("Meiryo", 10)
+        ).pack(side="left")
+
+        tk.Label(row, text="ポート:", bg="#0D1117", fg="white").pack(side="left", padx=(10, 2))
+
+        spin = tk.Spinbox(
+            row, from_=1024, to=65535, width=6,
+            textvariable=self.overlay_port,
+            bg="#000000", fg="white", insertbackground="white"
+        )
+        spin.pack(side="left")
+        spin.bind("<Return>", lambda e: self.apply_overlay_settings())
+
+        self.overlay_label = tk.Label(row, text="", bg="#0D1117", fg="#8B949E")
+        self.overlay_label.pack(side="left", padx=10)
+
+        # 通知ルール
+        frame_alert = tk.LabelFrame(frame, text="通知ルール ※空欄の条件はすべてに一致（ワードはカンマ区切り）",
+                                    bg="#0D1117", fg="white")
+        frame_alert.pack(fill="x", padx=10, pady=10)
+
+        self.alert_entries = {}
+        for key, text in (("name", "名前:"), ("words", "ワード:"), ("regex", "正規表現:"), ("speakers", "発言者:")):
+            row = tk.Frame(frame_alert, bg="#0D1117")
+            row.pack(fill="x", padx=5, pady=1)
+            tk.Label(row, text=text, width=8, anchor="w", bg="#0D1117", fg="white").pack(side="left")
+            entry = tk.Entry(row, bg="#0D1117", fg="white", insertbackground="white")
+            entry.pack(side="left", fill="x", expand=True, padx=5)
+            self.alert_entries[key] = entry
+
+        row = tk.Frame(frame_alert, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=1)
+
+        self.alert_channel_vars = {}
+        for chat_type in chat_order:
+            var = tk.BooleanVar(value=False)
+            tk.Checkbutton(
+                row,
+                text=chat_type,
+                variable=var,
+                bg="#0D1117",
+                fg=self.chat_display_colors.get(chat_type, "white"),
+                selectcolor="#0D1117",
+                font=("Meiryo", 10)
+            ).pack(side="left", padx=3)
+            self.alert_channel_vars[chat_type] = var
+
+        row = tk.Frame(frame_alert, bg="#0D1117")
+        row.pack(fill="x", padx=5, pady=1)
+
+        self.alert_bell_var = tk.BooleanVar(value=True)
+        self.alert_flash_var = tk.BooleanVar(value=True)
+        for text, var in (("音", self.alert_bell_var), ("コンパクト点滅", self.alert_flash_var)):
+            tk.Checkbutton(
+                row,
+                text=text,
+                variable=var,
+                bg="#0D1117",
+                fg="white",
+                selectcolor="#0D1117",
+                font=("Meiryo", 10)
+            ).pack(side="left", padx=3)
+
+        tk.Button(row, text="追加", command=self.add_alert_rule,
+                  bg="#1F2A44", fg="white").pack(side="left", padx=3)
+        tk.Button(row, text="削除", command=self.remove_alert_rule,
+                  bg="#1F2A44", fg="white").pack(side="left", padx=3)
+
+        self.alert_error_label = tk.Label(row, text="", bg="#0D1117", fg="#FF6B6B")
+        self.alert_error_label.pack(side="left", padx=5)
+
+        self.alert_listbox = Listbox(frame_alert, height=5, bg="#0D1117", fg="white")
+        self.alert_listbox.pack(fill="x", padx=5, pady=5)
+        self.refresh_alert_list()
+
         # NG / SP ワード設定（横並び）
         frame_ngsp = tk.LabelFrame(frame, text="NG / SP ワード設定",
                                    bg="#0D1117", fg="white")
@@ -482,6 +1087,266 @@ class ChatViewerVer3:
         self.sp_listbox = Listbox(sp_frame, height=6, bg="#0D1117", fg="white")
         self.sp_listbox.pack(fill="both", expand=True, pady=5)
 
+        # 発言者ミュート / 常時表示（横並び）
+        frame_speaker = tk.LabelFrame(frame, text="発言者ミュート / 常時表示 ※ビューの右クリックでも設定できます",
+                                      bg="#0D1117", fg="white")
+        frame_speaker.pack(fill="x", padx=10, pady=10)
+
+        container = tk.Frame(frame_speaker, bg="#0D1117")
+        container.pack(fill="x")
+
+        self.speaker_entries = {}
+        self.speaker_listboxes = {}
+        for mode, text in (("mute", "ミュート:"), ("pin", "常時表示:")):
+            sub = tk.Frame(container, bg="#0D1117")
+            sub.pack(side="left", fill="both", expand=True, padx=5)
+
+            tk.Label(sub, text=text, bg="#0D1117", fg="white").pack(anchor="w")
+
+            entry = tk.Entry(sub, bg="#0D1117", fg="white", insertbackground="white")
+            entry.pack(fill="x", padx=5, pady=2)
+
+            tk.Button(sub, text="追加", command=lambda m=mode: self.add_speaker_entry(m),
+                      bg="#1F2A44", fg="white").pack(side="left", anchor="n", padx=3)
+            tk.Button(sub, text="削除", command=lambda m=mode: self.remove_speaker_entry(m),
+                      bg="#1F2A44", fg="white").pack(side="left", anchor="n", padx=3)
+
+            listbox = Listbox(sub, height=6, bg="#0D1117", fg="white")
+            listbox.pack(fill="both", expand=True, pady=5)
+
+            self.speaker_entries[mode] = entry
+            self.speaker_listboxes[mode] = listbox
+
+        self.refresh_speaker_lists()
+
+    # ============================================================
+    #   除外ログの表示（これから来るメッセージに反映）
+    # ============================================================
+    def apply_exclude_settings(self):
+        self.hidden_prefixes = tuple(pat for pat, var in self.exclude_options.items() if not var.get())
+        self.save_current_settings()
+
+    # ============================================================
+    #   繰り返しメッセージのまとめ（これから来るメッセージに反映）
+    # ============================================================
+    def apply_repeat_settings(self):
+        try:
+            self.repeats.window = max(0, int(self.repeat_window.get()))
+        except (tk.TclError, ValueError):
+            self.repeat_window.set(self.repeats.window)
+        self.repeats.channels = {ct for ct, var in self.repeat_channels.items() if var.get()}
+        self.save_current_settings()
+
+    def apply_flood_settings(self):
+        try:
+            self.flood.rate = max(0, int(self.flood_rate.get()))
+            self.flood.burst = max(1, int(self.flood_burst.get()))
+        except (tk.TclError, ValueError):
+            self.flood_rate.set(self.flood.rate)
+            self.flood_burst.set(self.flood.burst)
+        self.save_current_settings()
+
+    # ============================================================
+    #   通知ルール
+    # ============================================================
+    def load_alert_rules(self):
+        rules = []
+        for data in self.settings.get("alert_rules", DEFAULT_ALERT_RULES):
+            try:
+                rules.append(AlertRule.from_dict(data))
+            except re.error as e:
+                print("通知ルールの正規表現エラー:", data.get("name", ""), e)
+        return rules
+
+    def describe_alert_rule(self, rule):
+        parts = [rule.name or "(名前なし)"]
+        if rule.channels:
+            parts.append("/".join(ct for ct in chat_order if ct in rule.channels))
+        if rule.words:
+            parts.append("ワード: " + ",".join(rule.words))
+        if rule.regex:
+            parts.append(f"正規表現: {rule.regex}")
+        if rule.speakers:
+            parts.append("発言者: " + ",".join(sorted(rule.speakers)))
+        return "  ".join(parts)
+
+    def refresh_alert_list(self):
+        self.alert_listbox.delete(0, tk.END)
+        for rule in self.alerts.rules:
+            self.alert_listbox.insert(tk.END, self.describe_alert_rule(rule))
+
+    def add_alert_rule(self):
+        def split(key):
+            return [w.strip() for w in self.alert_entries[key].get().split(",") if w.strip()]
+
+        words = split("words")
+        speakers = split("speakers")
+        regex = self.alert_entries["regex"].get().strip()
+        channels = [ct for ct, var in self.alert_channel_vars.items() if var.get()]
+        if not (words or speakers or regex or channels):
+            self.alert_error_label.config(text="条件を1つ以上指定してください")
+            return
+        try:
+            rule = AlertRule(
+                self.alert_entries["name"].get().strip(), words, regex, channels, speakers,
+                self.alert_bell_var.get(), self.alert_flash_var.get()
+            )
+        except re.error as e:
+            self.alert_error_label.config(text=f"正規表現エラー: {e}")
+            return
+
+        self.alert_error_label.config(text="")
+        for entry in self.alert_entries.values():
+            entry.delete(0, tk.END)
+        # 判定側は新しいルール一覧に丸ごと差し替える
+        self.alerts.set_rules(self.alerts.rules + [rule])
+        self.refresh_alert_list()
+        self.save_current_settings()
+
+    def remove_alert_rule(self):
+        selection = self.alert_listbox.curselection()
+        if selection:
+            rules = list(self.alerts.rules)
+            del rules[selection[0]]
+            self.alerts.set_rules(rules)
+            self.refresh_alert_list()
+            self.save_current_settings()
+
+    def post_alert(self, rule, seq, text):
+        # 取り込みスレッドから。最初の1件で受け取りを予約する（描画のレーンとは別に、すぐ）
+        self.alert_events.put((rule, seq, text))
+        with self.alert_lock:
+            if self.alert_pending:
+                return
+            self.alert_pending = True
+        self.dispatcher.call(0, self.pump_alerts)
+
+    def pump_alerts(self):
+        # 取り込みスレッドからの通知をまとめて受け取る
+        with self.alert_lock:
+            self.alert_pending = False
+        bell = flash = False
+        last = None
+        while True:
+            try:
+                last = self.alert_events.get_nowait()
+            except queue.Empty:
+                break
+            self.alert_count += 1
+            bell = bell or last[0].bell
+            flash = flash or last[0].flash
+
+        if last is not None:
+            rule, self.alert_seq, text = last
+            self.alert_badge.config(text=f"通知 {self.alert_count}（{rule.name}）{text[:20]}")
+            if bell:
+                self.root.bell()
+            if flash:
+                self.flash_compact()
+
+    def flash_compact(self, count=6):
+        if not hasattr(self, "compact_border") or not self.compact_border.winfo_exists():
+            return
+        on = count > 0 and count % 2 == 0
+        self.compact_border.config(
+            highlightbackground="#FF6B6B" if on else "white",
+            highlightthickness=3 if on else 1
+        )
+        if count > 0:
+            self.root.after(250, self.flash_compact, count - 1)
+
+    def show_last_alert(self):
+        self.alert_count = 0
+        self.alert_badge.config(text="")
+        if self.alert_seq is not None and self.alert_seq in self.messages:
+            self.jump_to_seq(self.alert_seq)
+
+    def apply_budget_settings(self):
+        try:
+            self.budget.slice_ms = max(1, int(self.budget_ms.get()))
+        except (tk.TclError, ValueError):
+            self.budget_ms.set(self.budget.slice_ms)
+        self.budget.enabled = self.budget_mode.get()
+        self.save_current_settings()
+
+    def apply_overlay_settings(self, save=True):
+        # ポートを変えたときも作り直す
+        self.overlay.stop()
+        if self.overlay_enabled.get():
+            try:
+                port = int(self.overlay_port.get())
+            except (tk.TclError, ValueError):
+                port = OVERLAY_PORT
+                self.overlay_port.set(port)
+            self.overlay = OverlayServer(port=port)
+            try:
+                self.overlay.start()
+            except OSError as e:
+                self.overlay_enabled.set(False)
+                self.overlay_label.config(text=f"開始できません: {e}", fg="#FF6B6B")
+            else:
+                self.overlay_label.config(text=f"http://{self.overlay.host}:{self.overlay.port}/", fg="#8B949E")
+        else:
+            self.overlay_label.config(text="")
+        if save:
+            self.save_current_settings()
+
+    # ============================================================
+    #   診断タブ
+    # ============================================================
+    def build_diagnostics_tab(self):
+        frame = self.tab_diagnostics
+
+        self.diagnostics_label = tk.Label(
+            frame,
+            text="",
+            bg="#0D1117",
+            fg="white",
+            justify="left",
+            anchor="nw",
+            font=("MS Gothic", 10)
+        )
+        self.diagnostics_label.pack(fill="both", expand=True, padx=10, pady=10)
+
+    def refresh_diagnostics(self):
+        if self.diagnostics_job is not None:
+            self.root.after_cancel(self.diagnostics_job)
+            self.diagnostics_job = None
+
+        # 診断タブを開いている間だけ1秒ごとに更新
+        if self.notebook.select() != str(self.tab_diagnostics):
+            return
+        self.diagnostics_job = self.root.after(1000, self.refresh_diagnostics)
+
+        flooding = ", ".join(f"{name}({count})" for name, count in self.flood.flooding()[:10])
+        control = self.flush_control
+        budget = self.budget
+        overlay = self.overlay
+        reader_state = {"active": "読み込み中", "idle": "変化なし", "missing": "ログなし"}[self.backoff.state]
+        self.diagnostics_label.config(text="\n".join([
+            f"監視              : {'監視中' if self.reader.running else '停止中'}"
+            f"（{reader_state}、確認の間隔 {self.backoff.delay:g} 秒）"
+            f"  世代 {self.reader.generation}・停止待ちを打ち切ったスレッド {self.reader.stale}",
+            f"メッセージ        : 保持 {len(self.messages):,} 件 / 表示 {len(self.main_lines.seqs):,} 行",
+            f"繰り返しまとめ    : {self.repeats.collapsed:,} 件（追跡中 {len(self.repeats.entries):,}）",
+            f"連投の省略        : {self.flood.suppressed:,} 件"
+            f"（追跡中の発言者 {len(self.flood.speakers):,} / {self.flood.max_speakers:,}、"
+            f"追い出し {self.flood.evicted:,}）",
+            f"省略中の発言者    : {flooding or 'なし'}",
+            f"通知              : {self.alerts.fired:,} 件（ルール {len(self.alerts.rules)}）",
+            f"描画待ち          : 優先 {len(self.render_lanes.lanes[PRIORITY]):,} / 通常 {len(self.render_lanes.lanes[BULK]):,}",
+            f"描画の調整        : 間隔 {control.delay_ms()}ms / 1回 {control.batch_size():,} 件まで"
+            f"（流入 {control.current_rate():,.1f} 件/秒、1行 {control.cost_ms:.3f}ms）",
+            f"直近の描画        : {control.last_lines:,} 件 {control.last_ms:.1f}ms"
+            f"（累計 {control.flushes:,} 回 / {control.lines:,} 件）",
+            f"CPU節約モード     : {'有効' if budget.enabled else '無効'}（{budget.slice_ms}ms / フレーム）"
+            f"  区切り {budget.slices:,} 回・最長 {budget.worst_ms:.1f}ms",
+            f"予算超過          : {budget.overruns:,} 回（直近 {budget.last_overrun or 'なし'}）"
+            f"  取り込みの待機 {budget.reader_yields:,} 回",
+            f"オーバーレイ      : {f'配信中（ポート {overlay.port}）' if overlay.running else '停止中'}"
+            f"  接続 {overlay.clients} / 送信 {overlay.sent:,} 件 / 遅れて飛ばした {overlay.dropped:,} 件",
+        ]))
+
     # ============================================================
     #   NG / SP
     # ============================================================
@@ -537,14 +1402,296 @@ class ChatViewerVer3:
             self.redraw_messages()
             self.update_compact_messages()
 
+    # ============================================================
+    #   発言者ミュート / 常時表示
+    # ============================================================
+    def add_speaker_entry(self, mode):
+        entry = self.speaker_entries[mode]
+        speaker = entry.get().strip()
+        if speaker:
+            entry.delete(0, tk.END)
+            self.set_speaker_mode(speaker, mode)
+
+    def remove_speaker_entry(self, mode):
+        listbox = self.speaker_listboxes[mode]
+        selection = listbox.curselection()
+        if selection:
+            self.set_speaker_mode(listbox.get(selection[0]), None)
+
+    def refresh_speaker_lists(self):
+        for mode, speakers in (("mute", self.muted_speakers), ("pin", self.pinned_speakers)):
+            listbox = self.speaker_listboxes[mode]
+            listbox.delete(0, tk.END)
+            for speaker in sorted(speakers):
+                listbox.insert(tk.END, speaker)
+
+    def show_speaker_menu(self, event):
+        line = int(self.text_area.index(f"@{event.x},{event.y}").split(".")[0])
+        seq = self.main_lines.seq_at(line)
+        view = self.messages.snapshot()
+        if seq is None or seq not in view:
+            return
+        speaker = view.speaker_of(seq)
+        if not speaker:
+            return
+
+        menu = self.speaker_menu
+        menu.delete(0, tk.END)
+        if speaker in self.muted_speakers or speaker in self.pinned_speakers:
+            menu.add_command(label=f"{speaker} の設定を解除",
+                             command=lambda: self.set_speaker_mode(speaker, None))
+        if speaker not in self.muted_speakers:
+            menu.add_command(label=f"{speaker} をミュート",
+                             command=lambda: self.set_speaker_mode(speaker, "mute"))
+        if speaker not in self.pinned_speakers:
+            menu.add_command(label=f"{speaker} を常に表示",
+                             command=lambda: self.set_speaker_mode(speaker, "pin"))
+        menu.tk_popup(event.x_root, event.y_root)
+
+    def set_speaker_mode(self, speaker, mode):
+        self.muted_speakers.discard(speaker)
+        self.pinned_speakers.discard(speaker)
+        if mode == "mute":
+            self.muted_speakers.add(speaker)
+        elif mode == "pin":
+            self.pinned_speakers.add(speaker)
+
+        self.refresh_speaker_lists()
+        self.save_current_settings()
+        self.refresh_speaker_lines(speaker)
+
+    def refresh_speaker_lines(self, speaker):
+        # 発言者の索引に載っている行だけを差し込み・削除する（全体の再描画はしない）
+        has_compact = hasattr(self, "compact_text") and self.compact_text.winfo_exists()
+        if has_compact:
+            self.compact_text.config(state="normal")
+
+        view = self.messages.snapshot()
+        for seq in view.speaker_seqs(speaker):
+            chat_type, timestamp, message = self.display_message(seq, view)
+            show = self.should_show(seq, view)
+
+            self.update_line(self.text_area, self.main_lines, seq, show,
+                             lambda: self.format_main_line(chat_type, timestamp, message), chat_type)
+            if has_compact:
+                self.update_line(self.compact_text, self.compact_lines, seq, show,
+                                 lambda: f"{message}\n", chat_type)
+
+        if has_compact:
+            self.compact_text.config(state="disabled")
+
+    def update_line(self, widget, lines, seq, show, make_line, chat_type):
+        line = lines.line_of(seq)
+        if show and line is None:
+            line = lines.insert(seq)
+            widget.insert(f"{line}.0", make_line(), chat_type)
+        elif not show and line is not None:
+            lines.remove(seq)
+            widget.delete(f"{line}.0", f"{line + 1}.0")
+
     # ============================================================
     #   フィルタ変更
     # ============================================================
     def on_filter_changed(self, chat_type):
+        self.timeline_drawn = -1
+        self.update_timeline()
         self.redraw_messages()
         self.update_compact_messages()
         self.refresh_compact_tabs()
 
+    def apply_speaker_filter(self):
+        self.speaker_filter = self.speaker_entry.get().strip()
+        self.redraw_messages()
+        self.update_compact_messages()
+
+    # ============================================================
+    #   時速 / タイムラインの更新（取り込みがあったときだけ）
+    # ============================================================
+    def post_stats(self):
+        # 取り込みスレッドから（まとまりごと）。最初の1件で1秒後の更新を予約する
+        with self.stats_lock:
+            if self.stats_pending:
+                return
+            self.stats_pending = True
+        self.dispatcher.call(1000, self.refresh_stats)
+
+    def refresh_stats(self):
+        with self.stats_lock:
+            self.stats_pending = False
+        # ビュータブを開いていないときは描かない（戻したときに on_tab_changed から描く）
+        if self.notebook.select() != str(self.tab_view):
+            return
+        self.update_rates()
+        self.update_timeline()
+
+    # ============================================================
+    #   経験値の時速表示
+    # ============================================================
+    def update_rates(self):
+        if self.rates_job is not None:
+            self.root.after_cancel(self.rates_job)
+            self.rates_job = None
+
+        now = time.localtime()
+        now_secs = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+        rates = self.gains.per_hour(now_secs)
+        self.rate_label.config(
+            text=f"EXP/h: {rates['exp']:,.0f}　ルーンEXP/h: {rates['rune']:,.0f}"
+        )
+        self.update_loot_label(now_secs)
+
+        # 新しい取得がなくても直近60分から外れた分だけ下がるので、0 になるまでは1秒ごとに描き直す
+        if any(rates.values()) and self.notebook.select() == str(self.tab_view):
+            self.rates_job = self.root.after(1000, self.update_rates)
+
+    # ============================================================
+    #   取得パネル（ELSO / ペット拾得）
+    # ============================================================
+    def add_loot(self, kind, item, amount, secs):
+        # 取得1件ごとに、そのアイテムの行だけを書き換える
+        self.loot.add(kind, item, amount, secs)
+        self.post(("loot", kind, item))
+
+    def refresh_loot_row(self, kind, item):
+        entry = self.loot.items.get((kind, item))
+        if entry is None:
+            return
+        row, count, total = entry
+        text = f"{item} ×{total:,}" if kind == "pet" else f"{item} {total:,}（{count}回）"
+        if row < self.loot_listbox.size():
+            self.loot_listbox.delete(row)
+        self.loot_listbox.insert(row, text)
+
+    def update_loot_label(self, now_secs):
+        hours = self.loot.hours(now_secs)
+        elso = self.loot.totals["elso"]
+        pet = self.loot.totals["pet"]
+        self.loot_label.config(
+            text=f"ELSO: {elso:,}\n　{elso / hours:,.0f} /h\nペット: {pet:,}個\n　{pet / hours:,.1f} /h"
+        )
+
+    def reset_loot(self):
+        # 取り込みスレッドの追記とはロックで順番を揃え、描画待ちの行の書き換えも捨てる
+        if not self.reader.lock.acquire(blocking=False):
+            self.root.after(FRAME_MS, self.reset_loot)
+            return
+        try:
+            self.loot.reset()
+            self.render_lanes.drop("loot")
+        finally:
+            self.reader.lock.release()
+        self.loot_listbox.delete(0, tk.END)
+        now = time.localtime()
+        self.update_loot_label(now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+
+    # ============================================================
+    #   発言量タイムライン（変化があったときだけ描き直す）
+    # ============================================================
+    def update_timeline(self):
+        if self.timeline.version != self.timeline_drawn:
+            self.draw_timeline()
+
+    def draw_timeline(self):
+        canvas = self.timeline_canvas
+        canvas.delete("all")
+        self.timeline_drawn = self.timeline.version
+        if not len(self.timeline):
+            return
+
+        width = max(canvas.winfo_width(), 2)
+        height = max(canvas.winfo_height(), 10)
+        scale = (height - 2) / max(self.timeline.peak, 1)
+
+        for chat_type in chat_order:
+            if not self.filters[chat_type].get():
+                continue
+            columns = downsample_minmax(self.timeline.series(chat_type), width)
+            if not any(hi for _, hi in columns):
+                continue
+            step = width / len(columns)
+            coords = []
+            for x, (lo, hi) in enumerate(columns):
+                coords += (x * step, height - 1 - hi * scale, x * step, height - 1 - lo * scale)
+            canvas.create_line(*coords, fill=self.chat_display_colors.get(chat_type, "white"))
+
+    def on_timeline_click(self, event):
+        if not len(self.timeline):
+            return
+        width = max(self.timeline_canvas.winfo_width(), 1)
+        self.jump_to_index(self.timeline.time_at(event.x / width))
+
+    # ============================================================
+    #   時刻へ移動 / 時刻範囲
+    # ============================================================
+    def jump_to_time(self):
+        secs = parse_clock(self.jump_entry.get())
+        if secs < 0:
+            return
+        self.jump_to_index(self.messages.snapshot().clock_to_index(secs))
+
+    def jump_to_index(self, t):
+        view = self.messages.snapshot()
+        if len(view) and t < view.time_of(view.base):
+            # 切り詰めで画面から消えた時刻。残っている一番古い行へ飛ぶと誤解させるので、履歴を引く
+            self.show_history_at(t, view)
+            return
+        self.jump_status.config(text="")
+        self.jump_to_seq(view.seq_at_time(t))
+
+    def show_history_at(self, t, view):
+        secs = t % 86400
+        oldest = format_clock(view.time_of(view.base) % 86400)
+        note = f"{format_clock(secs)} は表示範囲（{oldest}〜）より前です"
+
+        # t の日付（index_times の日）を履歴の日付に換算する
+        hit = None
+        if self.history_day:
+            days_back = view.clock_day - t // 86400
+            noon = time.mktime(time.strptime(self.history_day, "%Y_%m_%d")) + 43200
+            day = time.strftime("%Y_%m_%d", time.localtime(noon - days_back * 86400))
+            try:
+                hit = next(ChatQuery(since=(day, secs), until=(day, 86399)).run(ARCHIVE_DIR), None)
+            except (OSError, ValueError) as e:
+                print("履歴の読み込みエラー:", e)
+        if hit is not None:
+            note += f"　履歴: {hit.timestamp} {hit.text[:40]}"
+        self.jump_status.config(text=note)
+
+    def jump_to_seq(self, seq):
+        line = self.main_lines.line_from(seq)
+        if line is None:
+            self.text_area.see(tk.END)
+            return
+        self.clear_search_highlight()
+        self.text_area.tag_add("search_highlight", f"{line}.0", f"{line}.0 lineend")
+        self.text_area.see(f"{line}.0")
+        self.search_index = f"{line}.0"
+
+    def apply_time_range(self):
+        start = parse_clock(self.range_start_entry.get())
+        end = parse_clock(self.range_end_entry.get())
+        if start < 0 and end < 0:
+            self.clear_time_range()
+            return
+        if start < 0:
+            start = 0
+        if end < 0:
+            end = 86399
+        # 終了が開始より前なら日付をまたぐ範囲
+        lo = self.messages.snapshot().clock_to_index(start)
+        self.time_range = (lo, lo + (end - start) % 86400)
+        self.redraw_messages()
+        self.update_compact_messages()
+
+    def clear_time_range(self):
+        self.range_start_entry.delete(0, tk.END)
+        self.range_end_entry.delete(0, tk.END)
+        if self.time_range is None:
+            return
+        self.time_range = None
+        self.redraw_messages()
+        self.update_compact_messages()
+
     def refresh_compact_tabs(self):
         if not hasattr(self, "compact_tabs"):
             return
@@ -560,49 +1707,99 @@ class ChatViewerVer3:
                 )
 
     # ============================================================
-    #   差分描画：メインテキスト
+    #   表示判定
     # ============================================================
-    def append_to_main_text(self, chat_type, timestamp, message, scroll=True):
+    def should_show(self, seq, view):
+        chat_type, _, message = view[seq]
+        speaker = view.speaker_of(seq)
+
+        if self.speaker_filter and speaker != self.speaker_filter:
+            return False
+
+        if self.time_range is not None:
+            t = view.time_of(seq)
+            if not self.time_range[0] <= t <= self.time_range[1]:
+                return False
+
+        # 発言者の設定はワードやフィルタより優先（集合の参照のみ）
+        if speaker in self.pinned_speakers:
+            return True
+        if speaker in self.muted_speakers:
+            return False
+
         is_sp = any(sp in message for sp in self.sp_words)
         is_ng = any(ng in message for ng in self.ng_words)
 
         if is_ng and not is_sp:
-            return
+            return False
 
         if not is_sp and not self.filters[chat_type].get():
-            return
+            return False
 
+        return True
+
+    def display_message(self, seq, view):
+        # まとめた繰り返しは末尾に ×N を付ける
+        chat_type, timestamp, message = view[seq]
+        count = view.repeat_count(seq)
+        if count > 1:
+            message = f"{message} ×{count}"
+        return chat_type, timestamp, message
+
+    def format_main_line(self, chat_type, timestamp, message):
         line = ""
         if self.show_time.get():
             line += f"{timestamp} "
         if self.show_label.get():
             line += f"[{chat_type}] "
         line += f"{message}\n"
+        return line
 
-        self.text_area.insert(tk.END, line, chat_type)
+    # ============================================================
+    #   差分描画：メインテキスト
+    # ============================================================
+    def append_to_main_text(self, seq, view, scroll=True):
+        if not self.should_show(seq, view):
+            return
+
+        # 描画待ちと再描画の両方から来ることがあるので、描画済みなら何もしない
+        if self.main_lines.seqs and seq <= self.main_lines.seqs[-1] and self.main_lines.line_of(seq):
+            return
+
+        chat_type, timestamp, message = self.display_message(seq, view)
+        line_text = self.format_main_line(chat_type, timestamp, message)
+        if self.main_lines.seqs and seq < self.main_lines.seqs[-1]:
+            # 優先レーンで先に描いた行より前のメッセージは番号順の位置に差し込む
+            line = self.main_lines.insert(seq)
+            self.text_area.insert(f"{line}.0", line_text, chat_type)
+        else:
+            self.text_area.insert(tk.END, line_text, chat_type)
+            self.main_lines.append(seq)
         if scroll:
             self.text_area.see(tk.END)
 
     # ============================================================
     #   差分描画：コンパクトテキスト
     # ============================================================
-    def append_to_compact(self, chat_type, message, scroll=True):
+    def append_to_compact(self, seq, view, scroll=True):
         if not hasattr(self, "compact_text") or not self.compact_text.winfo_exists():
             return
 
-        is_sp = any(sp in message for sp in self.sp_words)
-        is_ng = any(ng in message for ng in self.ng_words)
-
-        if is_ng and not is_sp:
+        if not self.should_show(seq, view):
             return
 
-        if not is_sp and not self.filters[chat_type].get():
+        if self.compact_lines.seqs and seq <= self.compact_lines.seqs[-1] and self.compact_lines.line_of(seq):
             return
 
+        chat_type, timestamp, message = self.display_message(seq, view)
         line = f"{message}\n"
 
         self.compact_text.config(state="normal")
-        self.compact_text.insert(tk.END, line, chat_type)
+        if self.compact_lines.seqs and seq < self.compact_lines.seqs[-1]:
+            self.compact_text.insert(f"{self.compact_lines.insert(seq)}.0", line, chat_type)
+        else:
+            self.compact_text.insert(tk.END, line, chat_type)
+            self.compact_lines.append(seq)
         if scroll:
             self.compact_text.see(tk.END)
         self.compact_text.config(state="disabled")
@@ -610,32 +1807,147 @@ class ChatViewerVer3:
     # ============================================================
     #   メッセージ追加
     # ============================================================
-    def add_message(self, chat_type, timestamp, message):
-        self.messages.append((chat_type, timestamp, message))
+    def add_message(self, chat_type, timestamp, message, speaker="", secs=None, lane=BULK):
+        # 1メッセージ = 1行を保つ
+        message = message.replace("\n", " ")
+        seq = self.messages.append(chat_type, timestamp, message, speaker, secs)
+        self.timeline.add(chat_type, self.messages.time_of(seq))
+        self.post(("add", seq), lane)
+        return seq
+
+    def add_repeat(self, seq):
+        # 繰り返しは新しい行を足さず、まとめ先の行を書き換える
+        self.messages.add_repeat(seq)
+        self.post(("repeat", seq))
+
+    # ============================================================
+    #   描画の受け渡し（取り込みスレッド → UI スレッド）
+    # ============================================================
+    def post(self, op, lane=BULK):
+        # 取り込みスレッドはレーンに積むだけ。最初の1件で UI スレッドに描画を予約する
+        # （取り込みスレッドからは Tk を呼ばない。予約は dispatcher のスレッドが出す）
+        self.flush_control.arrived()
+        lane = self.render_lanes.push(op, lane)
+        if lane is not None:
+            delay = 0 if lane == PRIORITY else self.flush_control.delay_ms()
+            self.dispatcher.call(delay, self.flush_lane, lane)
+
+    def flush_lane(self, lane):
+        # 通常レーンの件数・間隔は流入量と描画時間から決める
+        limit = None if lane == PRIORITY else self.flush_control.batch_size()
+        ops, more = self.render_lanes.take(lane, limit)
+        start = time.perf_counter()
+        self.render_ops(ops)
+        if lane == BULK:
+            self.flush_control.record(len(ops), (time.perf_counter() - start) * 1000)
+        if more:
+            self.root.after(max(FRAME_MS, self.flush_control.delay_ms()), self.flush_lane, lane)
+
+    def render_ops(self, ops):
+        has_compact = hasattr(self, "compact_text") and self.compact_text.winfo_exists()
+        added = False
+        # 1回の描画は同じスナップショットから読む（途中で切り詰められても行がずれない）
+        view = self.messages.snapshot()
+
+        for op in ops:
+            if op[0] == "add":
+                seq = op[1]
+                if seq not in view:
+                    continue
+                self.append_to_main_text(seq, view, scroll=False)
+                if has_compact:
+                    self.append_to_compact(seq, view, scroll=False)
+                added = True
+            elif op[0] == "repeat":
+                if op[1] in view:
+                    self.refresh_repeat(op[1], view, has_compact)
+            elif op[0] == "loot":
+                self.refresh_loot_row(op[1], op[2])
+
+        # スクロールはまとめて1回
+        if added:
+            self.text_area.see(tk.END)
+            if has_compact:
+                self.compact_text.see(tk.END)
+
+    def refresh_repeat(self, seq, view, has_compact):
+        chat_type, timestamp, message = self.display_message(seq, view)
 
-        if len(self.messages) > 5000:
-            del self.messages[:100]
+        self.replace_line(self.text_area, self.main_lines, seq,
+                          self.format_main_line(chat_type, timestamp, message), chat_type)
 
-        self.append_to_main_text(chat_type, timestamp, message)
+        if has_compact:
+            self.compact_text.config(state="normal")
+            self.replace_line(self.compact_text, self.compact_lines, seq, f"{message}\n", chat_type)
+            self.compact_text.config(state="disabled")
 
-        if hasattr(self, "compact_text") and self.compact_text.winfo_exists():
-            self.append_to_compact(chat_type, message)
+    def replace_line(self, widget, lines, seq, text, chat_type):
+        line = lines.line_of(seq)
+        if line is None:
+            return
+        widget.delete(f"{line}.0", f"{line + 1}.0")
+        widget.insert(f"{line}.0", text, chat_type)
 
     # ============================================================
     #   再描画・クリア
     # ============================================================
+    def visible_seqs(self, view):
+        # 発言者で絞り込み中は発言者ごとの索引から該当分だけ取り出す
+        if self.speaker_filter:
+            return view.speaker_seqs(self.speaker_filter)
+        # 時刻範囲は時刻索引の二分探索で切り出す
+        if self.time_range is not None:
+            return view.time_range_seqs(*self.time_range)
+        return view.seqs()
+
     def redraw_messages(self):
         self.text_area.delete("1.0", tk.END)
+        self.main_lines.clear()
+
+        # 何フレームかに分けて描くあいだも、始めた時点の内容を最後まで描く
+        # （それより新しい行は描画待ちから入る）
+        view = self.messages.snapshot()
+
+        def steps():
+            for seq in self.visible_seqs(view):
+                self.append_to_main_text(seq, view, scroll=False)
+                yield
+
+        self.run_sliced("redraw", steps(), lambda: self.text_area.see(tk.END))
+
+    def run_sliced(self, name, steps, done=None):
+        # 重い処理は予算ごとに区切って、フレームの合間に進める（同じ名前の処理は新しい方だけ）
+        job = self.sliced_jobs.pop(name, None)
+        if job is not None:
+            self.root.after_cancel(job)
 
-        for chat_type, timestamp, message in self.messages:
-            self.append_to_main_text(chat_type, timestamp, message, scroll=False)
+        def step():
+            self.sliced_jobs.pop(name, None)
+            if self.budget.run_slice(name, steps):
+                if done is not None:
+                    done()
+            else:
+                self.sliced_jobs[name] = self.root.after(FRAME_MS, step)
 
-        self.text_area.see(tk.END)
+        step()
 
     def clear_messages(self):
-        self.messages.clear()
+        # 取り込みスレッドの書き込みとは読み込みサービスのロックで順番を揃える。
+        # UI スレッドはロックを待たない（取り込み中なら次のフレームでやり直す）
+        if not self.reader.lock.acquire(blocking=False):
+            self.root.after(FRAME_MS, self.clear_messages)
+            return
+        try:
+            self.render_lanes.clear()
+            self.messages.clear()
+            self.repeats.clear()
+            self.flood.clear()
+            self.timeline.clear()
+        finally:
+            self.reader.lock.release()
         self.redraw_messages()
         self.update_compact_messages()
+        self.update_timeline()
 
     # ============================================================
     #   検索機能
@@ -648,7 +1960,10 @@ class ChatViewerVer3:
         if not pattern:
             return
         self.clear_search_highlight()
+        # 検索は Tk の1回の呼び出しで区切れないので、時間だけ記録する
+        start = time.perf_counter()
         idx = self.text_area.search(pattern, self.search_index, nocase=True, stopindex=tk.END)
+        self.budget.record("search", (time.perf_counter() - start) * 1000)
         if not idx:
             self.search_index = "1.0"
             return
@@ -662,7 +1977,9 @@ class ChatViewerVer3:
         if not pattern:
             return
         self.clear_search_highlight()
+        start = time.perf_counter()
         idx = self.text_area.search(pattern, self.search_index, nocase=True, stopindex="1.0", backwards=True)
+        self.budget.record("search", (time.perf_counter() - start) * 1000)
         if not idx:
             self.search_index = tk.END
             return
@@ -688,10 +2005,25 @@ class ChatViewerVer3:
         data = {
             "folder": self.base_folder,
             "chat_display_colors": self.chat_display_colors,
-            "exclude_options": {pat: var.get() for pat, var in self.exclude_options.items()},
+            # 取得パネルへ回す行（LOOT_PATTERNS）の設定はヘッドレス用にそのまま残す
+            "exclude_options": {
+                **self.settings.get("exclude_options", {}),
+                **{pat: var.get() for pat, var in self.exclude_options.items()},
+            },
             "filters": {ctype: var.get() for ctype, var in self.filters.items()},
             "ng_words": self.ng_words,
             "sp_words": self.sp_words,
+            "muted_speakers": sorted(self.muted_speakers),
+            "pinned_speakers": sorted(self.pinned_speakers),
+            "repeat_window": self.repeats.window,
+            "repeat_channels": sorted(self.repeats.channels),
+            "flood_rate": self.flood.rate,
+            "flood_burst": self.flood.burst,
+            "alert_rules": [rule.to_dict() for rule in self.alerts.rules],
+            "budget_mode": self.budget.enabled,
+            "budget_ms": self.budget.slice_ms,
+            "overlay_enabled": self.overlay_enabled.get(),
+            "overlay_port": self.overlay.port,
             "show_time": self.show_time.get(),
             "show_label": self.show_label.get(),
             "remember_state": self.remember_state.get(),
@@ -708,19 +2040,23 @@ class ChatViewerVer3:
         self.status_label.config(text="監視中", fg="#4CAF50")
 
         today = time.strftime("%Y_%m_%d")
-        filename = os.path.join(self.base_folder, f"TWChatLog_{today}.html")
 
-        t = threading.Thread(target=poll_file, args=(filename, self), daemon=True)
-        t.start()
+        self.reader.start(self)
+
+        threading.Thread(target=compact_history, args=(today,), daemon=True).start()
 
     def stop_monitor(self):
         self.monitoring = False
+        # UI スレッドなので終わるのを待たない（残ったスレッドの出力は世代で捨てられる）
+        self.reader.stop(HANDOFF_TIMEOUT)
         self.status_label.config(text="停止中", fg="#3A6EA5")
 
     # ============================================================
     #   クリック透過（compact）
     # ============================================================
     def toggle_click_through(self):
+        if windll is None:
+            return
         if not hasattr(self, "compact_window") or not self.compact_window.winfo_exists():
             return
 
@@ -748,12 +2084,21 @@ class ChatViewerVer3:
 
         self.compact_text.config(state="normal")
         self.compact_text.delete("1.0", tk.END)
+        self.compact_lines.clear()
+        self.compact_text.config(state="disabled")
 
-        for chat_type, timestamp, message in self.messages:
-            self.append_to_compact(chat_type, message, scroll=False)
+        view = self.messages.snapshot()
 
-        self.compact_text.see(tk.END)
-        self.compact_text.config(state="disabled")
+        def steps():
+            for seq in self.visible_seqs(view):
+                self.append_to_compact(seq, view, scroll=False)
+                yield
+
+        def done():
+            if self.compact_text.winfo_exists():
+                self.compact_text.see(tk.END)
+
+        self.run_sliced("compact", steps(), done)
 
     # ============================================================
     #   コンパクトモード：リンククリック
@@ -881,6 +2226,7 @@ class ChatViewerVer3:
             highlightthickness=1
         )
         text_frame.pack(fill="both", expand=True, padx=0, pady=0)
+        self.compact_border = text_frame
 
         scrollbar = tk.Scrollbar(text_frame)
         scrollbar.pack(side="right", fill="y")
@@ -967,72 +2313,197 @@ class ChatViewerVer3:
 
 
 # ============================================================
-#   ファイル監視
+#   表示対象の判定（除外ログ・NG/SP）
 # ============================================================
-def poll_file(filename, viewer):
-    last_size = 0
-    current_file = filename
+def accept_line(viewer, text, speaker=""):
+    if text.startswith(viewer.hidden_prefixes):
+        return False
 
-    while viewer.monitoring:
-        try:
-            today = time.strftime("%Y_%m_%d")
-            expected_file = os.path.join(viewer.base_folder, f"TWChatLog_{today}.html")
+    # 常時表示の発言者は SPワードと同じ扱い
+    is_ng = any(ng in text for ng in viewer.ng_words)
 
-            if expected_file != current_file:
-                current_file = expected_file
-                last_size = 0
+    return not (is_ng and not is_sp_line(viewer, text, speaker))
 
-            if not os.path.exists(current_file):
-                time.sleep(1)
-                continue
 
-            size = os.path.getsize(current_file)
-            if size > last_size:
-                with open(current_file, encoding="cp932", errors="ignore") as f:
-                    f.seek(last_size)
-                    new_data = f.read()
-                    last_size = size
+def is_sp_line(viewer, text, speaker=""):
+    return speaker in viewer.pinned_speakers or any(sp in text for sp in viewer.sp_words)
+
+
+# ============================================================
+#   取り込み（発言者の切り出し → 表示判定 → 追加）
+# ============================================================
+def ingest_line(viewer, chat_type, timestamp, text, secs, live=True):
+    viewer.session.add_message(chat_type, secs)
+
+    # 経験値などの行は除外される前に集計だけしておく
+    if chat_type == "システム":
+        gain = parse_gain(text)
+        if gain is not None:
+            viewer.gains.add(gain[0], gain[1], secs)
+            viewer.session.add_gain(gain[0], gain[1], secs)
+
+            # ELSO / ペット拾得は取得パネルへ（履歴はバイナリログに残る）
+            if gain[0] in LOOT_KINDS:
+                viewer.add_loot(*parse_loot(text), secs)
+                return
+
+    speaker, body = split_speaker(chat_type, text)
+    viewer.hot.add(chat_type, speaker, body, secs)
+    if not accept_line(viewer, text, speaker):
+        return
+
+    # 直前に同じ内容があれば、その行の ×N を増やすだけ
+    key, seq = viewer.repeats.lookup(chat_type, text, secs)
+    if seq is not None and seq in viewer.messages:
+        viewer.repeats.collapsed += 1
+        viewer.add_repeat(seq)
+        return
+
+    # 連投中の発言者は「省略」の1行にまとめて ×N で数える
+    if speaker not in viewer.pinned_speakers:
+        state = viewer.flood.check(chat_type, speaker, secs)
+        if state is not None:
+            if state[3] is not None and state[3] in viewer.messages:
+                viewer.add_repeat(state[3])
+            else:
+                state[3] = viewer.add_message(chat_type, timestamp, f"{speaker}: （連投のため省略）", speaker, secs)
+            return
+
+    # 通知はこのスレッドで判定し、UI へはキューで渡すだけ（履歴の再生中は鳴らさない）
+    rule = viewer.alerts.match(chat_type, speaker, text) if live else None
+
+    # 耳打ち・SP・通知は優先レーン（次のフレームで描く）
+    if rule is not None or chat_type in PRIORITY_CHANNELS or is_sp_line(viewer, text, speaker):
+        lane = PRIORITY
+    else:
+        lane = BULK
 
-                soup = BeautifulSoup(new_data, "html.parser")
-                fonts = soup.find_all("font")
+    # ミュート中の発言者も保持しておき、表示するかどうかは should_show で決める
+    seq = viewer.add_message(chat_type, timestamp, text, speaker, secs, lane)
+    if key is not None:
+        viewer.repeats.add(key, seq)
 
-                for i in range(0, len(fonts)-1, 2):
-                    time_font = fonts[i]
-                    chat_font = fonts[i+1]
+    # オーバーレイへは新しく届いた行だけ（ミュート中の発言者は送らない）。送るのは読み込み1回分ずつ
+    if live and viewer.overlay.running and speaker not in viewer.muted_speakers:
+        viewer.overlay_frames.append(
+            viewer.overlay.encode(chat_type, text, viewer.chat_display_colors.get(chat_type, "white"), timestamp, speaker)
+        )
 
-                    timestamp = time_font.text.strip()
-                    color = chat_font.get("color", "").lower()
-                    text = chat_font.text.strip()
+    if rule is not None:
+        viewer.post_alert(rule, seq, text)
 
-                    skip = False
-                    for pat in EXCLUDE_PATTERNS:
-                        if text.startswith(pat) and not viewer.exclude_options[pat].get():
-                            skip = True
-                            break
-                    if skip:
-                        continue
 
-                    if color in chat_colors:
-                        chat_type, _ = chat_colors[color]
+# ============================================================
+#   履歴を開く（前回の続きがあればHTMLを解析せずに再生）
+# ============================================================
+def open_history(token, day, size, viewer):
+    history = BinaryLogWriter(ARCHIVE_DIR, day, chat_order)
+    resume_size = history.resume_point(size)
 
-                        is_sp = any(sp in text for sp in viewer.sp_words)
-                        is_ng = any(ng in text for ng in viewer.ng_words)
+    if viewer.history_day != day:
+        viewer.history_day = day
+        viewer.history_count = 0
 
-                        if is_ng and not is_sp:
-                            continue
+    # 画面にまだ入っていない分だけを再生する
+    if resume_size and viewer.history_count < len(history):
+        with BinaryLogReader(history.path) as reader:
+            viewer.budget.reader_begin()
+            for record in reader.iter_from(viewer.history_count):
+                if not token.emit(replay_line, viewer, *record):
+                    break
+                viewer.budget.reader_tick()
 
-                        viewer.add_message(chat_type, timestamp, text)
+    return history, resume_size
 
-        except Exception as e:
-            print("エラー:", e)
 
-        time.sleep(1)
+def replay_line(viewer, chat_type, timestamp, text, secs):
+    ingest_line(viewer, chat_type, timestamp, text, secs, live=False)
+    viewer.history_count += 1
+
+
+def record_line(viewer, history, chat_type, timestamp, text, secs, live):
+    # 履歴には除外ログも含めてすべて残す
+    index = len(history)
+    history.append(chat_type, timestamp, text, secs)
+
+    # 前の読み込みスレッドが取り込み済みの行は飛ばす（停止→開始で二重にしない）
+    if index >= viewer.history_count:
+        ingest_line(viewer, chat_type, timestamp, text, secs, live)
+        viewer.history_count = index + 1
+
+
+# ============================================================
+#   前日以前の履歴を圧縮アーカイブへ
+# ============================================================
+def compact_history(today):
+    try:
+        compact_old_days(ARCHIVE_DIR, today)
+    except Exception as e:
+        print("アーカイブ作成エラー:", e)
+
+
+# ============================================================
+#   ファイル監視
+# ============================================================
+class ViewerSink:
+    # 取り込みの中核から受け取ったまとまりを、履歴とビューアへ渡す（読み込みスレッドで動く）
+    def __init__(self, token, viewer):
+        self.token = token
+        self.viewer = viewer
+        self.history = None
+
+    def open(self, path, day, size):
+        # 新しいログファイル（日付が変わったときも）→ その日の履歴を開いて続きの位置を返す
+        self.close()
+        self.history, resume_size = open_history(self.token, day, size, self.viewer)
+        return resume_size
+
+    def __call__(self, batch):
+        viewer = self.viewer
+        viewer.budget.reader_begin()
+        for record in batch.records:
+            # 停止を知らされた（または新しい世代が始まった）ら、ここで打ち切る
+            if not self.token.emit(record_line, viewer, self.history, record.channel,
+                                   record.timestamp, record.text, record.secs, batch.live):
+                viewer.overlay_frames = []
+                return
+            viewer.budget.reader_tick()
+        self.token.emit(self.history.checkpoint, batch.end)
+        viewer.post_stats()
+
+        # オーバーレイのイベントループを起こすのはまとまりごとに1回
+        if viewer.overlay_frames:
+            frames, viewer.overlay_frames = viewer.overlay_frames, []
+            viewer.overlay.publish_frames(frames)
+
+    def close(self):
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+
+
+def run_reader(token, viewer):
+    # ビューアは取り込みの中核の出力先の1つ（描画は RenderLanes で UI スレッドへ渡る）
+    sink = ViewerSink(token, viewer)
+    core = IngestCore(lambda: viewer.base_folder, Classifier(chat_colors), sink.open, viewer.backoff)
+    core.add_sink(sink)
+    token.on_stop(core.stop)
+    try:
+        asyncio.run(core.run())
+    finally:
+        sink.close()
 
 
 # ============================================================
 #   main
 # ============================================================
 if __name__ == "__main__":
+    # --headless なら GUI を作らずにログを標準出力へ流す。query なら過去ログを検索して終わり、
+    # api なら過去ログ検索 API だけを動かす
+    if "--headless" in sys.argv[1:] or sys.argv[1:2] in (["query"], ["api"]):
+        from twchat.cli import main
+        sys.exit(main(sys.argv[1:]))
+
     root = tk.Tk()
     viewer = ChatViewerVer3(root)
     root.mainloop()
\ No newline at end of file
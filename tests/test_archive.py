@@ -0,0 +1,170 @@
+import os
+
+import pytest
+
+from twchat import (
+    CHAT_ORDER, ArchiveReader, BinaryLogWriter, archive_path, compact_day, compact_old_days,
+    log_paths, split_speaker,
+)
+from twchat.archive import normalize
+
+DAY = "2026_01_01"
+BLOCK = 16
+
+
+def stamp(secs):
+    return f"[ {secs // 3600:02d}時 {secs // 60 % 60:02d}分 {secs % 60:02d}秒]"
+
+
+def make_records(n):
+    records = []
+    for i in range(n):
+        channel = CHAT_ORDER[i % 5]
+        text = f"user{i % 9}: 売ります アイテム{i % 13} No.{i}"
+        records.append((channel, stamp(i * 30), text, i * 30))
+    # 1件だけの珍しい語（ブルームフィルタでほかのブロックを飛ばせるか）
+    if n > 150:
+        records[150] = ("耳打ち", stamp(4500), "trader: 赤いポーション 買います", 4500)
+    return records
+
+
+def write_log(folder, day, records):
+    writer = BinaryLogWriter(folder, day, CHAT_ORDER)
+    for record in records:
+        writer.append(*record)
+    writer.checkpoint(0)
+    writer.close()
+    return log_paths(folder, day)[0]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    records = make_records(300)
+    path = archive_path(tmp_path, DAY)
+    compact_day(write_log(tmp_path, DAY, records), path, block_size=BLOCK)
+    return path, records
+
+
+def brute(records, channels=None, start=None, end=None, term=None, speaker=None):
+    hits = []
+    for n, (channel, timestamp, text, secs) in enumerate(records):
+        if channels is not None and channel not in channels:
+            continue
+        if start is not None and secs < start:
+            continue
+        if end is not None and secs > end:
+            continue
+        if speaker is not None and split_speaker(channel, text)[0] != speaker:
+            continue
+        if term is not None and normalize(term) not in normalize(text):
+            continue
+        hits.append((n, (channel, timestamp, text, secs)))
+    return hits
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_round_trip(tmp_path, codec):
+    records = make_records(100)
+    path = archive_path(tmp_path, DAY)
+    compact_day(write_log(tmp_path, DAY, records), path, block_size=BLOCK, codec=codec)
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 100
+        assert len(reader.blocks) == 7
+        assert list(reader.query()) == records
+
+
+def test_empty_log(tmp_path):
+    path = archive_path(tmp_path, DAY)
+    compact_day(write_log(tmp_path, DAY, []), path)
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 0
+        assert list(reader.query()) == []
+
+
+@pytest.mark.parametrize("filters", [
+    {"channels": ["耳打ち"]},
+    {"start": 1200, "end": 3000},
+    {"speaker": "user4"},
+    {"term": "ｱｲﾃﾑ7"},
+    {"channels": ["一般", "叫ぶ"], "start": 600, "term": "No.2"},
+    {"channels": ["存在しない種別"]},
+])
+def test_scan_matches_brute_force(archive, filters):
+    path, records = archive
+    with ArchiveReader(path) as reader:
+        assert list(reader.scan(**filters)) == brute(records, **filters)
+
+
+def test_bloom_skips_blocks(archive):
+    path, records = archive
+    with ArchiveReader(path) as reader:
+        hits = list(reader.query(term="赤いポーション"))
+        assert hits == [records[150]]
+        assert reader.blocks_read < len(reader.blocks) // 2
+
+
+def test_time_range_skips_blocks(archive):
+    path, records = archive
+    with ArchiveReader(path) as reader:
+        hits = list(reader.query(start=0, end=BLOCK * 30 - 1))
+        assert hits == records[:BLOCK]
+        assert reader.blocks_read == 1
+
+
+def test_speaker_index(archive):
+    path, records = archive
+    with ArchiveReader(path) as reader:
+        assert list(reader.query(speaker="trader")) == [records[150]]
+        assert reader.blocks_read == 1
+        assert list(reader.query(speaker="だれもいない")) == []
+
+
+@pytest.mark.parametrize("page", [1, 7, BLOCK, 50])
+def test_scan_after_cursor(archive, page):
+    path, records = archive
+    want = brute(records, channels=["耳打ち", "チーム"])
+    got = []
+    after = -1
+    with ArchiveReader(path) as reader:
+        while True:
+            hits = []
+            for hit in reader.scan(channels=["耳打ち", "チーム"], after=after):
+                hits.append(hit)
+                if len(hits) == page:
+                    break
+            got += hits
+            if len(hits) < page:
+                break
+            after = hits[-1][0]
+    assert got == want
+
+
+def test_scan_after_skips_whole_blocks(archive):
+    path, records = archive
+    with ArchiveReader(path) as reader:
+        hits = list(reader.scan(after=BLOCK * 10 - 1))
+        assert hits == list(enumerate(records))[BLOCK * 10:]
+        assert reader.blocks_read == len(reader.blocks) - 10
+
+
+def test_corrupt_archive(tmp_path):
+    path = archive_path(tmp_path, DAY)
+    with open(path, "wb") as f:
+        f.write(os.urandom(512))
+    with pytest.raises(ValueError):
+        ArchiveReader(path)
+
+
+def test_compact_old_days(tmp_path):
+    records = make_records(40)
+    for day in ("2026_01_01", "2026_01_02", "2026_01_03"):
+        write_log(tmp_path, day, records)
+    assert compact_old_days(tmp_path, "2026_01_03") == ["2026_01_01", "2026_01_02"]
+
+    for day in ("2026_01_01", "2026_01_02"):
+        assert not any(os.path.exists(p) for p in log_paths(tmp_path, day))
+        with ArchiveReader(archive_path(tmp_path, day)) as reader:
+            assert list(reader.query()) == records
+    # 今日の分はそのまま
+    assert os.path.exists(log_paths(tmp_path, "2026_01_03")[0])
+    assert not os.path.exists(archive_path(tmp_path, "2026_01_03"))
@@ -0,0 +1,146 @@
+import os
+
+from twchat import CHAT_ORDER, BinaryLogReader, BinaryLogWriter, log_paths, read_checkpoint
+
+DAY = "2026_01_01"
+
+
+def stamp(secs):
+    return f"[ {secs // 3600:02d}時 {secs // 60 % 60:02d}分 {secs % 60:02d}秒]"
+
+
+def make_records(n, step=10):
+    return [
+        (CHAT_ORDER[i % len(CHAT_ORDER)], stamp(i * step), f"user{i % 7}: メッセージ {i}", i * step)
+        for i in range(n)
+    ]
+
+
+def write_log(folder, records, index_every=4):
+    writer = BinaryLogWriter(folder, DAY, CHAT_ORDER, index_every=index_every)
+    for record in records:
+        writer.append(*record)
+    writer.checkpoint(len(records) * 100)
+    writer.close()
+    return log_paths(folder, DAY)[0]
+
+
+def test_round_trip(tmp_path):
+    records = make_records(50)
+    path = write_log(tmp_path, records)
+    with BinaryLogReader(path) as reader:
+        assert len(reader) == 50
+        assert list(reader.iter_from(0)) == records
+        assert reader.read(17, 5) == records[17:22]
+        assert reader.read(48, 10) == records[48:]
+        assert reader.read(60, 1) == []
+
+
+def test_reopen_appends(tmp_path):
+    records = make_records(30)
+    write_log(tmp_path, records[:10])
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    assert len(writer) == 10
+    for record in records[10:]:
+        writer.append(*record)
+    writer.close()
+    with BinaryLogReader(log_paths(tmp_path, DAY)[0]) as reader:
+        assert list(reader.iter_from(0)) == records
+
+
+def test_truncated_tail_is_recovered(tmp_path):
+    records = make_records(40)
+    path = write_log(tmp_path, records)
+    full = os.path.getsize(path)
+    # 最後のレコードの途中で切れた（書き込み中に落ちた）
+    with open(path, "r+b") as f:
+        f.truncate(full - 5)
+
+    with BinaryLogReader(path) as reader:
+        assert len(reader) == 39
+        assert list(reader.iter_from(0)) == records[:39]
+
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    assert len(writer) == 39
+    writer.append(*records[39])
+    writer.close()
+    with BinaryLogReader(path) as reader:
+        assert list(reader.iter_from(0)) == records
+
+
+def test_index_past_end_is_ignored(tmp_path):
+    records = make_records(40)
+    path = write_log(tmp_path, records)
+    _, index_path, _ = log_paths(tmp_path, DAY)
+    # 索引だけ先に書かれて、データが残らなかった
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    count = len(writer)
+    writer.close()
+    assert 0 < count < 40
+    with BinaryLogReader(path) as reader:
+        assert list(reader.iter_from(0)) == records[:count]
+
+
+def test_resume_point_drops_unconfirmed_records(tmp_path):
+    records = make_records(20)
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    for record in records[:12]:
+        writer.append(*record)
+    writer.checkpoint(1200)
+    # チェックポイント後の分は HTML から読み直される
+    for record in records[12:]:
+        writer.append(*record)
+    writer.close()
+
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    assert writer.resume_point(5000) == 1200
+    assert len(writer) == 12
+    writer.close()
+    assert read_checkpoint(tmp_path, DAY) == (12, 1200)
+    with BinaryLogReader(log_paths(tmp_path, DAY)[0]) as reader:
+        assert list(reader.iter_from(0)) == records[:12]
+
+
+def test_resume_point_restarts_when_source_shrank(tmp_path):
+    write_log(tmp_path, make_records(20))
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    # HTML が作り直されて短くなった
+    assert writer.resume_point(100) == 0
+    assert len(writer) == 0
+    writer.close()
+
+
+def test_truncate(tmp_path):
+    records = make_records(30)
+    write_log(tmp_path, records)
+    writer = BinaryLogWriter(tmp_path, DAY, CHAT_ORDER, index_every=4)
+    writer.truncate(9)
+    writer.append(*records[9])
+    writer.close()
+    with BinaryLogReader(log_paths(tmp_path, DAY)[0]) as reader:
+        assert list(reader.iter_from(0)) == records[:10]
+
+
+def test_seek_time(tmp_path):
+    records = make_records(50, step=10)
+    path = write_log(tmp_path, records)
+    with BinaryLogReader(path) as reader:
+        assert reader.seek_time(0) == 0
+        assert reader.seek_time(120) == 12
+        assert reader.seek_time(125) == 13
+        assert reader.seek_time(490) == 49
+        assert reader.seek_time(491) == 50
+        assert reader.seek_time(10 ** 6) == 50
+
+
+def test_seek_time_unordered(tmp_path):
+    # 時刻が前後しても、secs 以降で最初のレコードを返す
+    secs = [0, 50, 20, 30, 100, 60, 70, 200, 80, 90]
+    records = [("一般", stamp(s), f"a: {i}", s) for i, s in enumerate(secs)]
+    path = write_log(tmp_path, records, index_every=2)
+    with BinaryLogReader(path) as reader:
+        for target in (0, 10, 40, 55, 100, 150, 201):
+            want = next((i for i, s in enumerate(secs) if s >= target), len(secs))
+            assert reader.seek_time(target) == want
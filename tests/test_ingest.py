@@ -0,0 +1,89 @@
+from twchat import Chunk, ChunkParser, parse_chunk
+
+LINES = [
+    ("#ffffff", "[ 20時 00分 00秒]", "alice: こんにちは"),
+    ("#64ff64", "[ 20時 00分 05秒]", "bob: 耳打ちです &amp; 続き"),
+    ("#ff64ff", "[ 20時 00分 09秒]", "[ELSO] 1,234 ELSOを獲得しました。"),
+]
+
+
+def make_log(lines=LINES):
+    return "".join(
+        f'<font>{timestamp}</font><font color="{color}">{text}</font><br>\r\n'
+        for color, timestamp, text in lines
+    ).encode("cp932")
+
+
+def line_offsets(data):
+    offsets = []
+    start = 0
+    while True:
+        start = data.find(b"<font>", start)
+        if start < 0:
+            return offsets
+        offsets.append(start)
+        start += 1
+
+
+def expected(data):
+    return [
+        (color, timestamp, text.replace("&amp;", "&"), offset)
+        for (color, timestamp, text), offset in zip(LINES, line_offsets(data))
+    ]
+
+
+def feed_all(data, cuts):
+    parser = ChunkParser()
+    lines = []
+    end = 0
+    offset = 0
+    for cut in cuts + [len(data)]:
+        batch = parser.feed(Chunk("log.html", "2026_01_01", offset, data[offset:cut], True))
+        lines += batch.records
+        end = batch.end
+        offset = cut
+    return lines, end
+
+
+def test_parse_chunk_whole():
+    data = make_log()
+    lines, used = parse_chunk(data)
+    assert lines == expected(data)
+    assert data[used:] == b"<br>\r\n"
+
+
+def test_parse_chunk_holds_back_half_pair():
+    data = make_log()
+    # 時刻の <font> だけ書かれて、本文の <font> がまだ来ていない
+    second = line_offsets(data)[1]
+    cut = data.index(b"</font>", second) + len(b"</font>")
+    lines, used = parse_chunk(data[:cut])
+    assert lines == expected(data)[:1]
+    assert used == second
+
+
+def test_chunk_parser_every_split():
+    # どこで読み込みが切れても（タグや cp932 の2バイト文字の途中でも）結果は同じ
+    data = make_log()
+    want = expected(data)
+    for cut in range(1, len(data)):
+        lines, end = feed_all(data, [cut])
+        assert lines == want, cut
+        assert data[end:] == b"<br>\r\n"
+
+
+def test_chunk_parser_many_small_reads():
+    data = make_log()
+    lines, _ = feed_all(data, list(range(7, len(data), 7)))
+    assert lines == expected(data)
+
+
+def test_chunk_parser_drops_pending_on_new_file():
+    data = make_log()
+    parser = ChunkParser()
+    parser.feed(Chunk("a.html", "2026_01_01", 0, data[:30], True))
+    # 日付が変わって別のファイルになったら、前のファイルの持ち越しは捨てる
+    batch = parser.feed(Chunk("b.html", "2026_01_02", 0, data, True))
+    assert batch.records == expected(data)
+    assert batch.path == "b.html"
+
@@ -0,0 +1,108 @@
+import os
+from itertools import islice
+
+import pytest
+
+from twchat import (
+    CHAT_ORDER, BinaryLogWriter, ChatQuery, archive_path, compact_day, format_cursor, list_days, log_paths,
+    parse_moment,
+)
+
+DAYS = ["2026_01_01", "2026_01_02", "2026_01_03", "2026_01_04"]
+BROKEN = "2026_01_03"
+
+
+def stamp(secs):
+    return f"[ {secs // 3600:02d}時 {secs // 60 % 60:02d}分 {secs % 60:02d}秒]"
+
+
+def make_records(n, step=60):
+    return [
+        (CHAT_ORDER[i % len(CHAT_ORDER)], stamp(i * step), f"user{i % 5}: メッセージ {i}", i * step)
+        for i in range(n)
+    ]
+
+
+def write_log(folder, day, records):
+    writer = BinaryLogWriter(folder, day, CHAT_ORDER)
+    for record in records:
+        writer.append(*record)
+    writer.checkpoint(0)
+    writer.close()
+    return log_paths(folder, day)[0]
+
+
+@pytest.fixture
+def history(tmp_path):
+    # 1日目はアーカイブ、2日目と4日目は圧縮前のバイナリログ、3日目は壊れたアーカイブ
+    records = make_records(40)
+    compact_day(write_log(tmp_path, DAYS[0], records), archive_path(tmp_path, DAYS[0]), block_size=8)
+    write_log(tmp_path, DAYS[1], records)
+    with open(archive_path(tmp_path, BROKEN), "wb") as f:
+        f.write(os.urandom(256))
+    write_log(tmp_path, DAYS[3], records)
+    return tmp_path, records
+
+
+def want(records, days, channels=None):
+    return [
+        (day, n, channel, text)
+        for day in days
+        for n, (channel, _, text, _) in enumerate(records)
+        if channels is None or channel in channels
+    ]
+
+
+def got(hits):
+    return [(hit.day, hit.record, hit.channel, hit.text) for hit in hits]
+
+
+def test_list_days(history):
+    folder, _ = history
+    assert list_days(folder) == DAYS
+
+
+def test_unreadable_day_is_skipped(history):
+    folder, records = history
+    query = ChatQuery()
+    hits = got(query.run(folder))
+    assert hits == want(records, [DAYS[0], DAYS[1], DAYS[3]])
+    assert [day for day, _ in query.errors] == [BROKEN]
+
+
+@pytest.mark.parametrize("page", [1, 7, 40, 45])
+def test_cursor_resumes_across_days(history, page):
+    folder, records = history
+    channels = ["耳打ち", "チーム"]
+    hits = []
+    errors = []
+    cursor = None
+    while True:
+        # ページごとに新しい検索（API / CLI と同じく cursor だけを引き継ぐ）
+        query = ChatQuery(channels=channels)
+        chunk = list(islice(query.run(folder, cursor), page))
+        hits += got(chunk)
+        errors += [day for day, _ in query.errors]
+        if len(chunk) < page:
+            break
+        cursor = format_cursor(chunk[-1])
+    assert hits == want(records, [DAYS[0], DAYS[1], DAYS[3]], channels)
+    # 壊れた日はそこを通ったページで知らされ、次の日から続く
+    assert BROKEN in errors
+
+
+def test_cursor_at_end_of_day_starts_next_day(history):
+    folder, records = history
+    query = ChatQuery()
+    hits = got(query.run(folder, f"{DAYS[1]}:{len(records) - 1}"))
+    assert hits == want(records, [DAYS[3]])
+    assert [day for day, _ in query.errors] == [BROKEN]
+
+
+@pytest.mark.parametrize("day", [DAYS[0], DAYS[1]])
+def test_time_range_within_day(history, day):
+    folder, records = history
+    since = parse_moment(f"{day} 00:10")
+    until = parse_moment(f"{day} 00:20")
+    hits = got(ChatQuery(since, until).run(folder))
+    assert hits == [(day, n, r[0], r[2]) for n, r in enumerate(records) if 600 <= r[3] <= 1200]
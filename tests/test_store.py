@@ -0,0 +1,57 @@
+from twchat import MessageStore
+
+
+def stamp(secs):
+    return f"[ {secs // 3600:02d}時 {secs // 60 % 60:02d}分 {secs % 60:02d}秒]"
+
+
+def fill(store, start, n):
+    for i in range(start, start + n):
+        store.append("一般", stamp(i), f"user{i % 3}: メッセージ {i}", f"user{i % 3}", i)
+
+
+def test_snapshot_ignores_later_appends():
+    store = MessageStore(limit=100, trim=10)
+    fill(store, 0, 20)
+    view = store.snapshot()
+    fill(store, 20, 5)
+
+    assert len(view) == 20
+    assert list(view.seqs()) == list(range(20))
+    assert 20 not in view
+    assert len(list(view)) == 20
+    assert view.speaker_seqs("user1") == tuple(range(1, 20, 3))
+    assert view.seq_at_time(view.time_of(19) + 1) == 20
+    # ストア本体には見えている
+    assert len(store) == 25
+    assert store[24][2] == "user0: メッセージ 24"
+
+
+def test_snapshot_survives_trim():
+    store = MessageStore(limit=30, trim=10)
+    fill(store, 0, 30)
+    view = store.snapshot()
+    rows = list(view)
+    # 上限を超えて先頭が捨てられても、取った時点の範囲は読める
+    fill(store, 30, 15)
+
+    assert store.base > 0
+    assert 0 not in store
+    assert view.base == 0
+    assert list(view) == rows
+    assert view[0][2] == "user0: メッセージ 0"
+    assert view.speaker_of(4) == "user1"
+    assert view.speaker_seqs("user2") == tuple(range(2, 30, 3))
+
+
+def test_snapshot_survives_clear():
+    store = MessageStore()
+    fill(store, 0, 10)
+    view = store.snapshot()
+    store.clear()
+    fill(store, 10, 3)
+
+    assert len(store) == 3
+    assert list(store.seqs()) == [10, 11, 12]
+    assert len(view) == 10
+    assert view[9][2] == "user0: メッセージ 9"
@@ -0,0 +1,28 @@
+from .alerts import DEFAULT_ALERT_RULES, AlertEngine, AlertRule
+from .api import API_PORT, QueryServer
+from .budget import BUDGET_MS, FrameBudget
+from .binlog import BinaryLogReader, BinaryLogWriter, log_paths, read_checkpoint
+from .archive import ARCHIVE_DIR, ArchiveReader, archive_path, compact_day, compact_old_days
+from .channels import (
+    CHAT_COLORS, CHAT_ORDER, EXCLUDE_LABELS, EXCLUDE_PATTERNS, LOOT_LABELS, LOOT_PATTERNS, display_colors,
+)
+from .analytics import (
+    ActivityTimeline, SessionColumns, SessionStats, downsample_max, downsample_minmax, session_stats,
+)
+from .flood import FLOOD_BURST, FLOOD_RATE, FloodGuard
+from .gains import GAIN_KINDS, LOOT_KINDS, LootTracker, RateTracker, parse_gain, parse_loot
+from .idle import POLL_IDLE_MAX, POLL_MIN, POLL_MISSING_MAX, Backoff
+from .ingest import (
+    Batch, Chunk, ChunkParser, Classifier, IngestCore, Record, Subscription, classify, iter_records,
+    log_day, log_path, parse, parse_chunk, tail, tail_batches, tail_chunks,
+)
+from .overlay import OVERLAY_HOST, OVERLAY_PORT, OverlayServer
+from .pipeline import BULK, BULK_BATCH, BULK_MS, FRAME_MS, PRIORITY, FlushController, RenderLanes, UiDispatcher
+from .query import ChatQuery, Hit, format_cursor, list_days, parse_cursor, parse_day, parse_moment
+from .repeats import REPEAT_CHANNELS, REPEAT_WINDOW, RepeatCollapser, normalize_repeat
+from .service import HANDOFF_TIMEOUT, ReaderService, WorkerToken
+from .settings import DEFAULT_FOLDER, SETTINGS_FILE, load_settings, save_settings
+from .sketch import HOT_WINDOW, CountMinSketch, HotTracker, SpaceSaving, hot_words
+from .speakers import SPEAKER_CHANNELS, SpeakerTable, split_speaker
+from .store import MessageSnapshot, MessageStore
+from .timestamps import DayClock, format_clock, parse_clock, parse_timestamp
@@ -0,0 +1,80 @@
+import re
+
+# ============================================================
+#   通知ルール
+# ============================================================
+#   ワード（いずれかを含む）・正規表現・種別・発言者の組み合わせ。
+#   ワードと正規表現は1つの正規表現にまとめて、ルールを作るときに1回だけコンパイルする。
+#   空の条件は「すべて」に一致する（種別だけ指定すれば、その種別の全発言で通知）。
+class AlertRule:
+    def __init__(self, name, words=(), regex="", channels=(), speakers=(), bell=True, flash=True):
+        self.name = name
+        self.words = [w for w in words if w]
+        self.regex = regex
+        self.channels = frozenset(channels)
+        self.speakers = frozenset(speakers)
+        self.bell = bell
+        self.flash = flash
+
+        parts = [re.escape(w) for w in self.words]
+        if regex:
+            parts.append(f"(?:{regex})")
+        # 正規表現が不正なら re.error をそのまま投げる
+        self.pattern = re.compile("|".join(parts)) if parts else None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get("name", ""),
+            data.get("words", ()),
+            data.get("regex", ""),
+            data.get("channels", ()),
+            data.get("speakers", ()),
+            data.get("bell", True),
+            data.get("flash", True),
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "words": self.words,
+            "regex": self.regex,
+            "channels": sorted(self.channels),
+            "speakers": sorted(self.speakers),
+            "bell": self.bell,
+            "flash": self.flash,
+        }
+
+    def matches(self, chat_type, speaker, text):
+        if self.speakers and speaker not in self.speakers:
+            return False
+        return self.pattern is None or self.pattern.search(text) is not None
+
+
+DEFAULT_ALERT_RULES = [{"name": "耳打ち", "channels": ["耳打ち"]}]
+
+
+# ============================================================
+#   通知判定（取り込みスレッドで1行ずつ）
+# ============================================================
+#   種別ごとに対象のルールだけを並べておき、最初に一致したルールを返す
+class AlertEngine:
+    def __init__(self, rules=()):
+        self.fired = 0
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        self.rules = list(rules)
+        self.any_channel = tuple(rule for rule in self.rules if not rule.channels)
+        channels = {ch for rule in self.rules for ch in rule.channels}
+        self.by_channel = {
+            ch: tuple(rule for rule in self.rules if not rule.channels or ch in rule.channels)
+            for ch in channels
+        }
+
+    def match(self, chat_type, speaker, text):
+        for rule in self.by_channel.get(chat_type, self.any_channel):
+            if rule.matches(chat_type, speaker, text):
+                self.fired += 1
+                return rule
+        return None
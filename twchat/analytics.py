@@ -0,0 +1,189 @@
+from array import array
+
+from .gains import GAIN_KINDS
+from .timestamps import DayClock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ============================================================
+#   セッション集計用の列データ
+# ============================================================
+#   表示用のメッセージストアは件数で切り詰めるので、セッション全体の集計は
+#   ここに (時刻, 種別番号) の2列だけを別に持つ（1行あたり5バイト）。
+#   経験値などの取得量は1分ごとの合計だけを [分 * 種類数 + 種類] で持つ。
+class SessionColumns:
+    def __init__(self, channels, kinds=GAIN_KINDS):
+        self.channels = list(channels)
+        self.channel_ids = {name: i for i, name in enumerate(self.channels)}
+        self.kinds = kinds
+        self.kind_ids = {kind: i for i, kind in enumerate(kinds)}
+        self.clear()
+
+    def clear(self):
+        self.times = array("i")
+        self.channel_codes = array("B")
+        self.gain_minutes = array("q")
+        self.start_minute = -1
+        self.clock = DayClock()
+
+    def add_message(self, chat_type, secs):
+        if secs < 0:
+            return
+        self.times.append(self.clock.index(secs))
+        self.channel_codes.append(self.channel_ids[chat_type])
+
+    def add_gain(self, kind, amount, secs):
+        if secs < 0:
+            return
+        minute = self.clock.index(secs) // 60
+        if self.start_minute < 0:
+            self.start_minute = minute
+        offset = minute - self.start_minute
+        if offset < 0:
+            return
+        k = len(self.kinds)
+        need = (offset + 1) * k - len(self.gain_minutes)
+        if need > 0:
+            self.gain_minutes.frombytes(bytes(need * self.gain_minutes.itemsize))
+        self.gain_minutes[offset * k + self.kind_ids[kind]] += amount
+
+
+# ============================================================
+#   集計（NumPy でまとめて計算）
+# ============================================================
+class SessionStats:
+    pass
+
+
+def session_stats(session, window=60):
+    if np is None:
+        raise RuntimeError("NumPy がインストールされていません")
+
+    # 取り込み側が追記を続けられるよう、配列はスライスで写してから読む（memcpy 1回）
+    # 2列の追記の合間に読んでも長さを揃える
+    n = min(len(session.times), len(session.channel_codes))
+    n_ch = len(session.channels)
+    k = len(session.kinds)
+    times = np.frombuffer(session.times[:n], dtype=np.intc)
+    codes = np.frombuffer(session.channel_codes[:n], dtype=np.uint8)
+    gains = session.gain_minutes[:len(session.gain_minutes) // k * k]
+    gains = np.frombuffer(gains, dtype=np.int64).reshape(-1, k)
+
+    firsts = []
+    lasts = []
+    if len(times):
+        firsts.append(int(times.min()) // 60)
+        lasts.append(int(times.max()) // 60)
+    if len(gains):
+        firsts.append(session.start_minute)
+        lasts.append(session.start_minute + len(gains) - 1)
+    if not firsts:
+        return None
+
+    base = min(firsts)
+    n_min = max(lasts) - base + 1
+
+    stats = SessionStats()
+    stats.start_minute = base
+    stats.minutes = n_min
+    stats.channels = session.channels
+
+    # 種別ごとの1分あたり件数 [分, 種別]
+    minute_idx = times // 60 - base
+    stats.channel_counts = np.bincount(
+        minute_idx * n_ch + codes, minlength=n_min * n_ch
+    ).reshape(n_min, n_ch)
+    stats.channel_rates = stats.channel_counts.sum(axis=0) / n_min
+
+    # 取得量 [分, 種類]
+    per_minute = np.zeros((n_min, k), dtype=np.int64)
+    if len(gains):
+        off = session.start_minute - base
+        per_minute[off:off + len(gains)] = gains
+    stats.gains = per_minute
+
+    # 直近 window 分の移動合計 → 時速
+    csum = np.cumsum(per_minute, axis=0)
+    rolling = csum.copy()
+    rolling[window:] -= csum[:-window]
+    span = np.minimum(np.arange(1, n_min + 1), window)[:, None]
+    stats.per_hour = rolling * 60 / span
+
+    hours = n_min / 60
+    stats.totals = dict(zip(session.kinds, per_minute.sum(axis=0).tolist()))
+    stats.hourly = {kind: total / hours for kind, total in stats.totals.items()}
+    return stats
+
+
+def downsample_max(values, width):
+    # 描画幅に合わせて区間ごとの最大値に間引く
+    values = np.asarray(values)
+    if len(values) <= width:
+        return values
+    edges = np.linspace(0, len(values), width + 1).astype(np.intp)[:-1]
+    return np.maximum.reduceat(values, edges)
+
+
+# ============================================================
+#   発言量タイムライン（ビュー上部の帯グラフ）
+# ============================================================
+#   BUCKET 秒ごと・種別ごとの件数を [バケツ * 種別数 + 種別] で持ち、
+#   1件ごとに加算するだけで更新する。時刻はメッセージストアの index_times を使う。
+TIMELINE_BUCKET = 10
+
+
+class ActivityTimeline:
+    def __init__(self, channels, bucket=TIMELINE_BUCKET):
+        self.channels = list(channels)
+        self.channel_ids = {name: i for i, name in enumerate(self.channels)}
+        self.bucket = bucket
+        self.clear()
+
+    def clear(self):
+        self.counts = array("I")
+        self.first = -1
+        self.peak = 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self.counts) // len(self.channels)
+
+    def add(self, chat_type, t):
+        b = t // self.bucket
+        if self.first < 0:
+            self.first = b
+        offset = b - self.first
+        if offset < 0:
+            return
+        n_ch = len(self.channels)
+        need = (offset + 1) * n_ch - len(self.counts)
+        if need > 0:
+            self.counts.frombytes(bytes(need * self.counts.itemsize))
+        i = offset * n_ch + self.channel_ids[chat_type]
+        self.counts[i] += 1
+        if self.counts[i] > self.peak:
+            self.peak = self.counts[i]
+        self.version += 1
+
+    def series(self, chat_type):
+        return self.counts[self.channel_ids[chat_type]::len(self.channels)]
+
+    def time_at(self, fraction):
+        # 帯グラフ上の位置（0〜1）→ index_times の時刻
+        n = len(self)
+        return (self.first + min(max(int(fraction * n), 0), n - 1)) * self.bucket
+
+
+def downsample_minmax(values, width):
+    # 描画の1列ごとに (最小, 最大) を取る。山も谷も消えない
+    n = len(values)
+    if n <= width:
+        return [(v, v) for v in values]
+    out = []
+    for x in range(width):
+        chunk = values[x * n // width:(x + 1) * n // width]
+        out.append((min(chunk), max(chunk)))
+    return out
@@ -0,0 +1,181 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .archive import ARCHIVE_DIR
+from .query import ChatQuery, format_cursor, list_days, parse_cursor, parse_moment
+from .timestamps import format_clock
+
+# ============================================================
+#   過去ログ検索 API（localhost の HTTP / JSON）
+# ============================================================
+#   GET /days
+#       → {"days": ["2026-10-18", ...]}
+#   GET /query?since=2026-10-01&until=2026-10-19 21:00&channel=耳打ち&speaker=...&term=...&regex=...
+#             &limit=100&cursor=...
+#       → {"results": [...], "next": "<cursor>", "errors": [...]}   next があれば cursor に渡して続きを取る
+#   &format=jsonl を付けると1件1行で返す（limit=0 なら最後まで）
+#   読めなかった日は飛ばし、errors（jsonl では最後に {"date": ..., "error": ...} の行）で知らせる
+#
+#   結果は見つけたそばから書き出すので、件数が多くても全体をメモリに持たない。
+#
+#   耳打ちも返すので、ほかのサイトのページからは読ませない。Host ヘッダが
+#   127.0.0.1:<port> / localhost:<port> 以外（DNS リバインディング）と、
+#   Origin ヘッダが自分以外のものは 403。
+API_HOST = "127.0.0.1"
+API_PORT = 8766
+PAGE_SIZE = 100
+PAGE_MAX = 1000
+WRITE_EVERY = 256
+
+
+def hit_json(hit):
+    return json.dumps({
+        "date": hit.day.replace("_", "-"),
+        "time": format_clock(hit.secs) if hit.secs >= 0 else hit.timestamp,
+        "channel": hit.channel,
+        "speaker": hit.speaker,
+        "text": hit.text,
+        "cursor": format_cursor(hit),
+    }, ensure_ascii=False).encode("utf-8")
+
+
+def errors_json(query):
+    return [{"date": day.replace("_", "-"), "error": error} for day, error in query.errors]
+
+
+def query_from_params(params):
+    # parse_qs の結果から。読めない値は ValueError / re.error
+    def one(name):
+        values = params.get(name)
+        return values[-1].strip() if values and values[-1].strip() else None
+
+    since = one("since")
+    until = one("until")
+    channels = [c for value in params.get("channel", ()) for c in value.split(",") if c]
+    return ChatQuery(
+        since=parse_moment(since) if since else None,
+        until=parse_moment(until, end=True) if until else None,
+        channels=channels,
+        speaker=one("speaker"),
+        term=one("term"),
+        regex=one("regex"),
+    )
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server_version = "twchat"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            if not self.server.allowed(self.headers.get("host"), self.headers.get("origin")):
+                self.send_json({"error": "forbidden"}, 403)
+            elif url.path == "/days":
+                days = [day.replace("_", "-") for day in list_days(self.server.folder)]
+                self.send_json({"days": days})
+            elif url.path == "/query":
+                self.send_query(params)
+            else:
+                self.send_json({"error": "not found"}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_query(self, params):
+        try:
+            query = query_from_params(params)
+            jsonl = params.get("format", ["json"])[-1] == "jsonl"
+            limit = int(params.get("limit", [PAGE_SIZE if not jsonl else 0])[-1])
+            if not jsonl:
+                limit = min(max(limit, 1), PAGE_MAX)
+            cursor = params.get("cursor", [None])[-1] or None
+            if cursor:
+                parse_cursor(cursor)
+        except (ValueError, re.error) as e:
+            self.send_json({"error": str(e)}, 400)
+            return
+
+        hits = query.run(self.server.folder, cursor)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8" if jsonl
+                         else "application/json; charset=utf-8")
+        self.end_headers()
+
+        out = []
+        if jsonl:
+            for n, hit in enumerate(hits, 1):
+                out.append(hit_json(hit) + b"\n")
+                if len(out) >= WRITE_EVERY:
+                    self.wfile.write(b"".join(out))
+                    out.clear()
+                if n == limit:
+                    break
+            for error in errors_json(query):
+                out.append(json.dumps(error, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.write(b"".join(out))
+            return
+
+        # 1件多く探して、続きがあるかどうかを決める
+        self.wfile.write(b'{"results": [')
+        last = None
+        more = False
+        n = 0
+        for hit in hits:
+            if n == limit:
+                more = True
+                break
+            out.append((b", " if n else b"") + hit_json(hit))
+            last = hit
+            n += 1
+            if len(out) >= WRITE_EVERY:
+                self.wfile.write(b"".join(out))
+                out.clear()
+        out.append(b'], "next": ' + json.dumps(format_cursor(last) if more else None).encode("ascii")
+                   + b', "errors": ' + json.dumps(errors_json(query), ensure_ascii=False).encode("utf-8") + b"}")
+        self.wfile.write(b"".join(out))
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, folder=ARCHIVE_DIR, host=API_HOST, port=API_PORT):
+        super().__init__((host, port), QueryHandler)
+        self.folder = folder
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def allowed(self, host, origin):
+        # どちらもヘッダなし（curl などブラウザ以外から）はよい
+        names = {f"{name}:{self.port}" for name in (self.host, "127.0.0.1", "localhost")}
+        if host and host not in names:
+            return False
+        return not origin or origin in {f"http://{name}" for name in names}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="query-api", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
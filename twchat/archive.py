@@ -0,0 +1,346 @@
+import os
+import glob
+import math
+import lzma
+import zlib
+import struct
+import hashlib
+import threading
+import unicodedata
+
+from .binlog import (
+    BinaryLogReader, log_paths,
+    _encode_header, _read_header, _encode_record, _decode_record, _LEN,
+)
+from .speakers import split_speaker
+
+# ============================================================
+#   圧縮アーカイブ（過去の日付）
+# ============================================================
+#   <day>.twarc : ヘッダ + [ブロックヘッダ + ブルームフィルタ + 圧縮データ] の繰り返し
+#                 + 発言者索引 + 末尾(索引の位置, FOOTER_MAGIC)
+#
+#   ブロックは BLOCK_SIZE 件ずつ。ブロックヘッダの時刻範囲・種別ごとの件数・
+#   ブルームフィルタで、検索に関係ないブロックは展開せずに飛ばす。
+#   発言者索引は 発言者名 → その発言を含むブロック番号 の一覧。
+
+ARCHIVE_DIR = "archive"
+
+MAGIC = b"TWCA"
+FOOTER_MAGIC = b"TWCS"
+VERSION = 3
+BLOCK_SIZE = 4096
+BLOOM_FP_RATE = 0.02
+
+CODECS = {
+    "zlib": (0, lambda b: zlib.compress(b, 9), zlib.decompress),
+    "lzma": (1, lzma.compress, lzma.decompress),
+}
+_CODEC_BY_ID = {cid: (name, dec) for name, (cid, _, dec) in CODECS.items()}
+
+# codec, 件数, 先頭レコード番号, 最小時刻, 最大時刻, ブルームのビット数, ハッシュ数, ブルームのバイト数, 圧縮長
+_BLOCK = struct.Struct("<BIQiiIBII")
+_TRAILER = struct.Struct("<Q4s")
+
+
+# ============================================================
+#   検索語の正規化（全角半角・大文字小文字を揃えて 1〜2文字単位に分解）
+# ============================================================
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def text_terms(text):
+    text = normalize(text)
+    terms = set(text)
+    terms.update(text[i:i + 2] for i in range(len(text) - 1))
+    terms.discard(" ")
+    return terms
+
+
+def query_terms(term):
+    term = normalize(term)
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+# ============================================================
+#   ブルームフィルタ
+# ============================================================
+class BloomFilter:
+    def __init__(self, m_bits, k, bits=None):
+        self.m_bits = m_bits
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((m_bits + 7) // 8)
+
+    @classmethod
+    def for_terms(cls, terms, fp_rate=BLOOM_FP_RATE):
+        n = max(len(terms), 1)
+        # m = -n ln p / (ln 2)^2, k = m/n ln 2
+        m_bits = max(64, int(-n * math.log(fp_rate) / math.log(2) ** 2))
+        k = max(1, round(m_bits / n * math.log(2)))
+        bloom = cls(m_bits, min(k, 16))
+        for term in terms:
+            bloom.add(term)
+        return bloom
+
+    def _positions(self, term):
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        h1 = int.from_bytes(digest[:4], "little")
+        h2 = int.from_bytes(digest[4:], "little") | 1
+        return [(h1 + i * h2) % self.m_bits for i in range(self.k)]
+
+    def add(self, term):
+        for p in self._positions(term):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, term):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(term))
+
+
+# ============================================================
+#   書き出し
+# ============================================================
+def _write_block(f, records, first_record, channel_ids, codec):
+    # 戻り値: このブロックに発言のある発言者
+    codec_id, compress, _ = CODECS[codec]
+    raw = bytearray()
+    counts = [0] * len(channel_ids)
+    terms = set()
+    times = []
+    speakers = set()
+
+    for channel, timestamp, text, secs in records:
+        payload = _encode_record(channel_ids[channel], timestamp, text, secs)
+        raw += _LEN.pack(len(payload))
+        raw += payload
+        counts[channel_ids[channel]] += 1
+        speaker, _ = split_speaker(channel, text)
+        if speaker:
+            speakers.add(speaker)
+        terms.update(text_terms(text))
+        if secs >= 0:
+            times.append(secs)
+
+    bloom = BloomFilter.for_terms(terms)
+    body = compress(bytes(raw))
+    f.write(_BLOCK.pack(
+        codec_id, len(records), first_record,
+        min(times) if times else -1, max(times) if times else -1,
+        bloom.m_bits, bloom.k, len(bloom.bits), len(body)
+    ))
+    f.write(struct.pack(f"<{len(counts)}I", *counts))
+    f.write(bloom.bits)
+    f.write(body)
+    return speakers
+
+
+def _write_speaker_index(f, speaker_blocks):
+    offset = f.tell()
+    f.write(struct.pack("<I", len(speaker_blocks)))
+    for name, blocks in speaker_blocks.items():
+        raw = name.encode("utf-8")
+        f.write(struct.pack("<BI", len(raw), len(blocks)))
+        f.write(raw)
+        f.write(struct.pack(f"<{len(blocks)}I", *blocks))
+    f.write(_TRAILER.pack(offset, FOOTER_MAGIC))
+
+
+def archive_path(folder, day):
+    return os.path.join(folder, day + ".twarc")
+
+
+def compact_day(log_path, out_path, block_size=BLOCK_SIZE, codec="zlib"):
+    tmp_path = out_path + ".tmp"
+    with BinaryLogReader(log_path) as reader, open(tmp_path, "wb") as f:
+        channel_ids = {name: i for i, name in enumerate(reader.channels)}
+        f.write(_encode_header(reader.channels, MAGIC, VERSION))
+
+        speaker_blocks = {}
+        n_blocks = 0
+
+        def flush(block, first):
+            nonlocal n_blocks
+            for speaker in _write_block(f, block, first, channel_ids, codec):
+                speaker_blocks.setdefault(speaker, []).append(n_blocks)
+            n_blocks += 1
+
+        block = []
+        first = 0
+        for i, rec in enumerate(reader.iter_from(0)):
+            block.append(rec)
+            if len(block) >= block_size:
+                flush(block, first)
+                block = []
+                first = i + 1
+        if block:
+            flush(block, first)
+
+        _write_speaker_index(f, speaker_blocks)
+
+    os.replace(tmp_path, out_path)
+
+
+_compacting = threading.Lock()
+
+
+def compact_old_days(folder, today, codec="zlib"):
+    # 今日より前のバイナリログを圧縮アーカイブへ移す
+    # 同じプロセスで同時に2つ走ると同じ .tmp を書き合うので、実行中なら何もしない
+    if not _compacting.acquire(blocking=False):
+        return []
+    try:
+        done = []
+        for log_path in sorted(glob.glob(os.path.join(folder, "*.twlog"))):
+            day = os.path.splitext(os.path.basename(log_path))[0]
+            if day >= today:
+                continue
+            compact_day(log_path, archive_path(folder, day), codec=codec)
+            for path in log_paths(folder, day):
+                if os.path.exists(path):
+                    os.remove(path)
+            done.append(day)
+        return done
+    finally:
+        _compacting.release()
+
+
+# ============================================================
+#   読み込み
+# ============================================================
+class ArchiveBlock:
+    __slots__ = (
+        "codec", "count", "first_record", "min_time", "max_time",
+        "channel_counts", "bloom_m", "bloom_k", "bloom_offset", "bloom_size",
+        "data_offset", "data_size",
+    )
+
+    def may_match(self, channel_ids=None, start=None, end=None):
+        if channel_ids is not None and not any(self.channel_counts[c] for c in channel_ids):
+            return False
+        if self.min_time >= 0:
+            if start is not None and self.max_time < start:
+                return False
+            if end is not None and self.min_time > end:
+                return False
+        return True
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, "rb")
+        self.channels = _read_header(self.f, MAGIC, VERSION)
+        self.channel_ids = {name: i for i, name in enumerate(self.channels)}
+        data_start = self.f.tell()
+        footer = self._read_speaker_index()
+        self.blocks = self._read_blocks(data_start, footer)
+        self.blocks_read = 0
+
+    def _read_speaker_index(self):
+        size = os.fstat(self.f.fileno()).st_size
+        self.f.seek(size - _TRAILER.size)
+        offset, magic = _TRAILER.unpack(self.f.read(_TRAILER.size))
+        if magic != FOOTER_MAGIC:
+            raise ValueError(f"{self.path} の末尾が壊れています")
+
+        self.f.seek(offset)
+        raw = self.f.read(size - _TRAILER.size - offset)
+        (n,) = struct.unpack_from("<I", raw, 0)
+        pos = 4
+        self.speaker_blocks = {}
+        for _ in range(n):
+            name_len, count = struct.unpack_from("<BI", raw, pos)
+            pos += 5
+            name = raw[pos:pos + name_len].decode("utf-8")
+            pos += name_len
+            self.speaker_blocks[name] = struct.unpack_from(f"<{count}I", raw, pos)
+            pos += 4 * count
+        return offset
+
+    def _read_blocks(self, pos, size):
+        blocks = []
+        counts_fmt = struct.Struct(f"<{len(self.channels)}I")
+        while pos + _BLOCK.size <= size:
+            self.f.seek(pos)
+            b = ArchiveBlock()
+            (b.codec, b.count, b.first_record, b.min_time, b.max_time,
+             b.bloom_m, b.bloom_k, b.bloom_size, b.data_size) = _BLOCK.unpack(self.f.read(_BLOCK.size))
+            b.channel_counts = counts_fmt.unpack(self.f.read(counts_fmt.size))
+            b.bloom_offset = pos + _BLOCK.size + counts_fmt.size
+            b.data_offset = b.bloom_offset + b.bloom_size
+            pos = b.data_offset + b.data_size
+            blocks.append(b)
+        return blocks
+
+    def __len__(self):
+        return sum(b.count for b in self.blocks)
+
+    def bloom(self, block):
+        self.f.seek(block.bloom_offset)
+        return BloomFilter(block.bloom_m, block.bloom_k, bytearray(self.f.read(block.bloom_size)))
+
+    def read_block(self, block):
+        self.f.seek(block.data_offset)
+        raw = _CODEC_BY_ID[block.codec][1](self.f.read(block.data_size))
+        self.blocks_read += 1
+        records = []
+        pos = 0
+        while pos < len(raw):
+            (n,) = _LEN.unpack_from(raw, pos)
+            pos += _LEN.size
+            records.append(_decode_record(raw[pos:pos + n], self.channels))
+            pos += n
+        return records
+
+    def query(self, channels=None, start=None, end=None, term=None, speaker=None):
+        for _, record in self.scan(channels, start, end, term, speaker):
+            yield record
+
+    def scan(self, channels=None, start=None, end=None, term=None, speaker=None, after=-1):
+        # query() と同じ条件で (その日のレコード番号, レコード) を返す。after 番までは飛ばす
+        channel_ids = None
+        if channels is not None:
+            channel_ids = [self.channel_ids[c] for c in channels if c in self.channel_ids]
+        terms = query_terms(term) if term else None
+        needle = normalize(term) if term else None
+
+        if speaker:
+            blocks = [self.blocks[i] for i in self.speaker_blocks.get(speaker, ())]
+        else:
+            blocks = self.blocks
+
+        for block in blocks:
+            if block.first_record + block.count <= after + 1:
+                continue
+            if not block.may_match(channel_ids, start, end):
+                continue
+            if terms:
+                bloom = self.bloom(block)
+                if not all(t in bloom for t in terms):
+                    continue
+            for n, record in enumerate(self.read_block(block), block.first_record):
+                if n <= after:
+                    continue
+                channel, timestamp, text, secs = record
+                if channels is not None and channel not in channels:
+                    continue
+                if start is not None and secs < start:
+                    continue
+                if end is not None and secs > end:
+                    continue
+                if speaker and split_speaker(channel, text)[0] != speaker:
+                    continue
+                if needle and needle not in normalize(text):
+                    continue
+                yield n, record
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
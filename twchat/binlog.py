@@ -0,0 +1,336 @@
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .timestamps import parse_timestamp
+
+# ============================================================
+#   バイナリログ（追記専用）
+# ============================================================
+#   <day>.twlog : ヘッダ + [長さ(u32) + レコード] の繰り返し
+#   <day>.twidx : INDEX_EVERY 件ごとの (レコード番号, オフセット, それまでの最大時刻)
+#   <day>.twpos : 取り込み済みの (レコード数, HTMLのバイト位置)
+#
+#   レコード : 種別番号(u8) + 時刻の秒数(i32) + 時刻の長さ(u8) + 時刻 + 本文（文字列はUTF-8）
+#   レコードは (種別, 時刻文字列, 本文, 0時からの秒数) のタプルで返す
+
+MAGIC = b"TWCL"
+VERSION = 2
+INDEX_EVERY = 256
+
+_LEN = struct.Struct("<I")
+_HEAD = struct.Struct("<BiB")
+_IDX = struct.Struct("<QQi")
+_POS = struct.Struct("<QQ")
+
+
+def log_paths(folder, day):
+    base = os.path.join(folder, day)
+    return base + ".twlog", base + ".twidx", base + ".twpos"
+
+
+def _encode_header(channels, magic=MAGIC, version=VERSION):
+    data = bytearray(magic)
+    data.append(version)
+    data.append(len(channels))
+    for name in channels:
+        raw = name.encode("utf-8")
+        data.append(len(raw))
+        data += raw
+    return bytes(data)
+
+
+def _read_header(f, magic=MAGIC, version=VERSION):
+    head = f.read(6)
+    if len(head) < 6 or head[:4] != magic:
+        raise ValueError(f"{f.name} は対応する形式ではありません")
+    if head[4] != version:
+        raise ValueError(f"未対応のバージョン: {head[4]}")
+    channels = []
+    for _ in range(head[5]):
+        n = f.read(1)
+        name = f.read(n[0]) if n else b""
+        if not n or len(name) < n[0]:
+            raise ValueError(f"{f.name} のヘッダが途中で切れています")
+        channels.append(name.decode("utf-8", errors="replace"))
+    return channels
+
+
+def _encode_record(channel_id, timestamp, text, secs):
+    ts = timestamp.encode("utf-8")[:255]
+    return _HEAD.pack(channel_id, secs, len(ts)) + ts + text.encode("utf-8")
+
+
+def _decode_record(payload, channels):
+    channel_id, secs, n = _HEAD.unpack_from(payload)
+    pos = _HEAD.size
+    timestamp = payload[pos:pos + n].decode("utf-8", errors="ignore")
+    text = payload[pos + n:].decode("utf-8", errors="ignore")
+    return channels[channel_id], timestamp, text, secs
+
+
+def _load_index(path, data_size):
+    records = array("Q")
+    offsets = array("Q")
+    times = array("i")
+    if not os.path.exists(path):
+        return records, offsets, times
+    with open(path, "rb") as f:
+        raw = f.read()
+    for pos in range(0, len(raw) - _IDX.size + 1, _IDX.size):
+        rec, off, secs = _IDX.unpack_from(raw, pos)
+        # 途中で切れたデータを指すエントリは捨てる
+        if off >= data_size or (records and rec <= records[-1]):
+            break
+        records.append(rec)
+        offsets.append(off)
+        times.append(secs)
+    return records, offsets, times
+
+
+def _scan(f, offset, end):
+    # offset から完全なレコードだけを数える（戻り値: 終端オフセット, 各レコードの位置, 各レコードの秒数）
+    starts = []
+    secs = []
+    f.seek(offset)
+    while offset + _LEN.size + _HEAD.size <= end:
+        (n,) = _LEN.unpack(f.read(_LEN.size))
+        if offset + _LEN.size + n > end:
+            break
+        _, sec, _ = _HEAD.unpack(f.read(_HEAD.size))
+        starts.append(offset)
+        secs.append(sec)
+        f.seek(n - _HEAD.size, os.SEEK_CUR)
+        offset += _LEN.size + n
+    return offset, starts, secs
+
+
+def read_checkpoint(folder, day):
+    _, _, pos_path = log_paths(folder, day)
+    try:
+        with open(pos_path, "rb") as f:
+            return _POS.unpack(f.read(_POS.size))
+    except (OSError, struct.error):
+        return None
+
+
+# ============================================================
+#   書き込み
+# ============================================================
+class BinaryLogWriter:
+    def __init__(self, folder, day, channels, index_every=INDEX_EVERY):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.day = day
+        self.path, self.index_path, self.pos_path = log_paths(folder, day)
+        self.index_every = index_every
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self._create(channels)
+        try:
+            with open(self.path, "rb") as f:
+                self.channels = _read_header(f)
+                self.data_start = f.tell()
+        except ValueError:
+            # 古い形式のログは作り直す（続きはHTMLから読み直される）
+            self._create(channels)
+            self.channels = list(channels)
+            self.data_start = len(_encode_header(channels))
+        self.channel_ids = {name: i for i, name in enumerate(self.channels)}
+
+        self._recover()
+        self.f = open(self.path, "ab")
+        self.idx_f = open(self.index_path, "ab")
+
+    def _create(self, channels):
+        with open(self.path, "wb") as f:
+            f.write(_encode_header(channels))
+        for path in (self.index_path, self.pos_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _recover(self):
+        # 前回異常終了していても、完全なレコードまでで揃え直す
+        size = os.path.getsize(self.path)
+        records, offsets, times = _load_index(self.index_path, size)
+        if records:
+            count, offset, max_secs = records[-1], offsets[-1], times[-1]
+        else:
+            count, offset, max_secs = 0, self.data_start, -1
+
+        with open(self.path, "rb") as f:
+            end, starts, secs = _scan(f, offset, size)
+
+        for i, start in enumerate(starts):
+            rec = count + i
+            max_secs = max(max_secs, secs[i])
+            if rec % self.index_every == 0 and (not records or rec > records[-1]):
+                records.append(rec)
+                offsets.append(start)
+                times.append(max_secs)
+
+        self.count = count + len(starts)
+        self.size = end
+        self.max_secs = max_secs
+        self.index_records = records
+        self.index_offsets = offsets
+        self.index_times = times
+
+        if end < size:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        self._rewrite_index()
+
+    def _rewrite_index(self):
+        with open(self.index_path, "wb") as f:
+            for entry in zip(self.index_records, self.index_offsets, self.index_times):
+                f.write(_IDX.pack(*entry))
+
+    def append(self, channel, timestamp, text, secs=None):
+        if secs is None:
+            secs = parse_timestamp(timestamp)
+        payload = _encode_record(self.channel_ids[channel], timestamp, text, secs)
+        self.max_secs = max(self.max_secs, secs)
+        if self.count % self.index_every == 0:
+            self.index_records.append(self.count)
+            self.index_offsets.append(self.size)
+            self.index_times.append(self.max_secs)
+            self.idx_f.write(_IDX.pack(self.count, self.size, self.max_secs))
+        self.f.write(_LEN.pack(len(payload)))
+        self.f.write(payload)
+        self.size += _LEN.size + len(payload)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def checkpoint(self, source_size):
+        self.f.flush()
+        self.idx_f.flush()
+        with open(self.pos_path, "wb") as f:
+            f.write(_POS.pack(self.count, source_size))
+
+    def truncate(self, count):
+        # count 件目以降を捨てる
+        self.f.flush()
+        self.idx_f.flush()
+        if count >= self.count:
+            return
+        i = bisect_right(self.index_records, count) - 1
+        if i < 0:
+            rec, offset, max_secs = 0, self.data_start, -1
+        else:
+            rec, offset, max_secs = self.index_records[i], self.index_offsets[i], self.index_times[i]
+        with open(self.path, "rb") as f:
+            _, starts, secs = _scan(f, offset, self.size)
+        end = starts[count - rec] if count - rec < len(starts) else self.size
+        for sec in secs[:count - rec]:
+            max_secs = max(max_secs, sec)
+
+        self.f.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(end)
+        self.f = open(self.path, "ab")
+
+        keep = bisect_left(self.index_records, count)
+        del self.index_records[keep:]
+        del self.index_offsets[keep:]
+        del self.index_times[keep:]
+        self.idx_f.close()
+        self._rewrite_index()
+        self.idx_f = open(self.index_path, "ab")
+
+        self.count = count
+        self.size = end
+        self.max_secs = max_secs
+        if os.path.exists(self.pos_path):
+            os.remove(self.pos_path)
+
+    def resume_point(self, source_size):
+        # 前回の続きから読めるHTMLの位置を返す。整合しなければ記録を捨てて 0
+        pos = read_checkpoint(self.folder, self.day)
+        if pos is None or pos[0] > self.count or pos[1] > source_size:
+            self.truncate(0)
+            return 0
+        if pos[0] < self.count:
+            self.truncate(pos[0])
+            self.checkpoint(pos[1])
+        return pos[1]
+
+    def close(self):
+        self.f.close()
+        self.idx_f.close()
+
+
+# ============================================================
+#   読み込み
+# ============================================================
+class BinaryLogReader:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".twidx"
+        self.f = open(path, "rb")
+        self.channels = _read_header(self.f)
+        self.data_start = self.f.tell()
+        self.refresh()
+
+    def refresh(self):
+        # 書き込み中のファイルでも、その時点の完全なレコードまでを読む
+        size = os.fstat(self.f.fileno()).st_size
+        self.index_records, self.index_offsets, self.index_times = _load_index(self.index_path, size)
+        if self.index_records:
+            base, offset = self.index_records[-1], self.index_offsets[-1]
+        else:
+            base, offset = 0, self.data_start
+        self.end, starts, _ = _scan(self.f, offset, size)
+        self.count = base + len(starts)
+
+    def __len__(self):
+        return self.count
+
+    def _seek_entry(self, i):
+        if i < 0:
+            self.f.seek(self.data_start)
+            return 0
+        self.f.seek(self.index_offsets[i])
+        return self.index_records[i]
+
+    def _seek(self, n):
+        rec = self._seek_entry(bisect_right(self.index_records, n) - 1)
+        for _ in range(n - rec):
+            (size,) = _LEN.unpack(self.f.read(_LEN.size))
+            self.f.seek(size, os.SEEK_CUR)
+
+    def seek_time(self, secs):
+        # secs 以降の最初のレコード番号（索引の最大時刻で二分探索してから順に読む）
+        rec = self._seek_entry(bisect_left(self.index_times, secs) - 1)
+        while rec < self.count:
+            (size,) = _LEN.unpack(self.f.read(_LEN.size))
+            _, sec, _ = _HEAD.unpack(self.f.read(_HEAD.size))
+            if sec >= secs:
+                return rec
+            self.f.seek(size - _HEAD.size, os.SEEK_CUR)
+            rec += 1
+        return self.count
+
+    def iter_from(self, start=0, count=None):
+        if start >= self.count:
+            return
+        stop = self.count if count is None else min(self.count, start + count)
+        self._seek(start)
+        for _ in range(start, stop):
+            (size,) = _LEN.unpack(self.f.read(_LEN.size))
+            yield _decode_record(self.f.read(size), self.channels)
+
+    def read(self, start, count):
+        return list(self.iter_from(start, count))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
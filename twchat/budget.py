@@ -0,0 +1,56 @@
+import time
+
+from .pipeline import FRAME_MS
+
+# ============================================================
+#   CPU節約モード（1フレームあたりの処理時間の上限）
+# ============================================================
+#   再描画などの重い処理はジェネレータにして、slice_ms ごとに区切って進める。
+#   取り込みスレッドも slice_ms 使ったら1フレーム分休む。
+#   区切りは1件処理してから時間を見るので、最後の1件の分（OVERRUN_GRACE_MS）までは許し、
+#   それを超えた処理（1件で超えたもの・区切れない処理）を overruns に数える。
+BUDGET_MS = 8
+OVERRUN_GRACE_MS = 1
+
+
+class FrameBudget:
+    def __init__(self, slice_ms=BUDGET_MS, enabled=False):
+        self.slice_ms = slice_ms
+        self.enabled = enabled
+        self.slices = 0
+        self.overruns = 0
+        self.worst_ms = 0.0
+        self.last_overrun = ""
+        self.reader_yields = 0
+        self.reader_start = time.perf_counter()
+
+    def record(self, name, elapsed_ms):
+        self.slices += 1
+        self.worst_ms = max(self.worst_ms, elapsed_ms)
+        if self.enabled and elapsed_ms > self.slice_ms + OVERRUN_GRACE_MS:
+            self.overruns += 1
+            self.last_overrun = f"{name} {elapsed_ms:.1f}ms"
+
+    def run_slice(self, name, steps):
+        # steps を予算いっぱいまで進める。最後まで終わったら True
+        start = time.perf_counter()
+        deadline = start + self.slice_ms / 1000 if self.enabled else None
+        done = True
+        for _ in steps:
+            if deadline is not None and time.perf_counter() >= deadline:
+                done = False
+                break
+        self.record(name, (time.perf_counter() - start) * 1000)
+        return done
+
+    def reader_begin(self):
+        self.reader_start = time.perf_counter()
+
+    def reader_tick(self):
+        # 取り込みスレッド：予算を使い切ったら1フレーム分ほかへ譲る
+        if not self.enabled:
+            return
+        if time.perf_counter() - self.reader_start >= self.slice_ms / 1000:
+            time.sleep(FRAME_MS / 1000)
+            self.reader_yields += 1
+            self.reader_start = time.perf_counter()
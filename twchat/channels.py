@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+# ============================================================
+#   チャット色設定
+# ============================================================
+#   ログの文字色 → (種別, 既定の表示色)
+CHAT_COLORS = OrderedDict({
+    "#c8ffc8": ("一般", "white"),
+    "#ffffff": ("一般", "white"),
+    "#64ff64": ("耳打ち", "green"),
+    "#f7b73c": ("チーム", "orange"),
+    "#94ddfa": ("クラブ", "cyan"),
+    "#ff64ff": ("システム", "#FFD56B"),
+    "#c896c8": ("叫ぶ", "violet")
+})
+
+CHAT_ORDER = ["一般", "耳打ち", "チーム", "クラブ", "システム", "叫ぶ"]
+
+
+def display_colors(saved=None):
+    # 種別 → 表示色（settings.json の chat_display_colors で上書き）
+    colors = {}
+    for ctype, disp in CHAT_COLORS.values():
+        colors.setdefault(ctype, disp)
+    for ctype, col in (saved or {}).items():
+        if ctype in colors:
+            colors[ctype] = col
+    return colors
+
+# ============================================================
+#   除外ログ（設定の exclude_options で True にしたものだけ表示）
+# ============================================================
+EXCLUDE_LABELS = {
+    "経験値が": "取得経験値",
+    "ルーン経験値が": "取得ルーン経験値",
+}
+
+EXCLUDE_PATTERNS = list(EXCLUDE_LABELS.keys())
+
+# ELSO / ペット拾得の行。GUI は取得パネルへ回すのでチャット欄の除外設定には出さないが、
+# ヘッドレスやオーバーレイでは除外ログと同じく exclude_options で出すかどうかを決める
+LOOT_LABELS = {
+    "[ELSO": "取得ELSO",
+    "ペットが": "ペット取得",
+}
+
+LOOT_PATTERNS = list(LOOT_LABELS.keys())
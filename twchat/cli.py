@@ -0,0 +1,237 @@
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+
+from .api import API_HOST, API_PORT, QueryServer, hit_json
+from .archive import ARCHIVE_DIR
+from .channels import display_colors
+from .ingest import Classifier, tail_batches
+from .overlay import OVERLAY_PORT, OverlayServer
+from .query import ChatQuery, format_cursor, parse_cursor, parse_moment
+from .settings import DEFAULT_FOLDER, SETTINGS_FILE, load_settings
+from .timestamps import format_clock
+
+# ============================================================
+#   ヘッドレスモード（GUI なしでログを追って標準出力へ）
+# ============================================================
+#   python -m twchat --headless --jsonl
+#   1メッセージ = 1行の JSON。読み込み1回分をまとめて書き、そのたびに flush する。
+#   フォルダと除外ログの設定は settings.json（GUI と同じもの）を使う。
+#   --overlay を付けるとオーバーレイ配信、--api を付けると過去ログ検索 API も動かす
+#   （どちらかだけを付けたときは標準出力へは書かない）。
+
+
+def record_json(batch, record):
+    return json.dumps({
+        "day": batch.day,
+        "time": format_clock(record.secs) if record.secs >= 0 else record.timestamp,
+        "channel": record.channel,
+        "speaker": record.speaker,
+        "text": record.text,
+        "offset": record.offset,
+    }, ensure_ascii=False)
+
+
+def record_text(batch, record):
+    return f"{record.timestamp} [{record.channel}] {record.text}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="twchat", description="TalesWeaver チャットログの読み取り",
+                                     epilog="過去ログの検索は python -m twchat query --help（HTTP API だけなら api --help）")
+    parser.add_argument("--headless", action="store_true", help="GUI なしで今日のログを追い続ける")
+    parser.add_argument("--jsonl", action="store_true", help="1メッセージ = 1行の JSON で出力する")
+    parser.add_argument("--folder", help="チャットログのフォルダ（省略時は settings.json）")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="設定ファイル")
+    parser.add_argument("--from-start", action="store_true", help="今日のログを先頭から出力する")
+    parser.add_argument("--overlay", type=int, nargs="?", const=OVERLAY_PORT, metavar="PORT",
+                        help=f"ブラウザ / OBS 向けに配信する（既定のポート {OVERLAY_PORT}）")
+    parser.add_argument("--api", type=int, nargs="?", const=API_PORT, metavar="PORT",
+                        help=f"過去ログ検索の HTTP API を動かす（既定のポート {API_PORT}）")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="履歴（バイナリログ・アーカイブ）のフォルダ")
+    return parser
+
+
+def run_headless(args, out=None):
+    settings = load_settings(args.settings)
+    folder = args.folder or settings.get("folder", DEFAULT_FOLDER)
+    classifier = Classifier.from_settings(settings)
+    fmt = record_json if args.jsonl else record_text
+    out = out or sys.stdout.buffer
+    write = args.jsonl or (args.overlay is None and args.api is None)
+
+    overlay = None
+    if args.overlay is not None:
+        colors = display_colors(settings.get("chat_display_colors"))
+        overlay = OverlayServer(port=args.overlay)
+        overlay.start()
+        print(f"オーバーレイ: http://{overlay.host}:{overlay.port}/", file=sys.stderr)
+
+    api = None
+    if args.api is not None:
+        api = QueryServer(args.archive, port=args.api)
+        api.start()
+        print(f"検索 API: http://{api.host}:{api.port}/query", file=sys.stderr)
+
+    batches = tail_batches(folder, args.from_start, classifier)
+    try:
+        for batch in batches:
+            records = [record for record in batch.records if classifier.accepts(record)]
+            if overlay is not None:
+                overlay.publish_frames([
+                    overlay.encode(r.channel, r.text, colors.get(r.channel, "white"), r.timestamp, r.speaker)
+                    for r in records
+                ])
+            if write and records:
+                out.write(("\n".join(fmt(batch, record) for record in records) + "\n").encode("utf-8"))
+                out.flush()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        batches.close()
+        if overlay is not None:
+            overlay.stop()
+        if api is not None:
+            api.stop()
+    return 0
+
+
+# ============================================================
+#   過去ログ検索（python -m twchat query ...）
+# ============================================================
+#   python -m twchat query --since 2026-01-01 --channel 耳打ち --text ポーション --format csv
+#   アーカイブの索引（時刻・種別・ブルームフィルタ・発言者）で関係ないブロックを飛ばし、
+#   見つけたそばから書き出す。HTML は読まない。--text は索引が効く部分一致、
+#   --regex は他の条件で絞った残りに掛ける。
+#   --limit で打ち切ったときは、続きを取る --after の値を標準エラーに出す
+#   （csv / jsonl は各行にも cursor がある）。
+QUERY_FORMATS = ("text", "csv", "jsonl")
+QUERY_COLUMNS = ("date", "time", "channel", "speaker", "text", "cursor")
+
+
+def build_query_parser():
+    parser = argparse.ArgumentParser(prog="twchat query", description="過去ログ（アーカイブ）の検索")
+    parser.add_argument("--since", help="この日時から（2026-10-01 / \"2026-10-01 21:00\"）")
+    parser.add_argument("--until", help="この日時まで（日付だけならその日の終わりまで）")
+    parser.add_argument("--day", help="この日だけ（--since / --until の代わり）")
+    parser.add_argument("--channel", action="append", default=[], metavar="種別",
+                        help="種別で絞る（繰り返すか , 区切りで複数）")
+    parser.add_argument("--speaker", help="発言者名（完全一致）")
+    parser.add_argument("--text", help="本文の部分一致（全角半角・大文字小文字は区別しない）")
+    parser.add_argument("--regex", help="本文の正規表現")
+    parser.add_argument("--format", choices=QUERY_FORMATS, default="text", help="出力形式（既定 text）")
+    parser.add_argument("--limit", type=int, default=0, help="最大件数（0 なら全部）")
+    parser.add_argument("--after", metavar="CURSOR", help="この cursor（日付:番号）の続きから（--limit で打ち切ったときに表示される）")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="履歴（バイナリログ・アーカイブ）のフォルダ")
+    return parser
+
+
+def query_from_args(args):
+    # 読めない値は ValueError / re.error
+    if args.day:
+        since, until = parse_moment(args.day), parse_moment(args.day, end=True)
+    else:
+        since = parse_moment(args.since) if args.since else None
+        until = parse_moment(args.until, end=True) if args.until else None
+    if args.after:
+        parse_cursor(args.after)
+    channels = [c for value in args.channel for c in value.split(",") if c]
+    return ChatQuery(since, until, channels, args.speaker, args.text, args.regex)
+
+
+def hit_text(hit):
+    return f"{hit.day.replace('_', '-')} {hit.timestamp} [{hit.channel}] {hit.text}"
+
+
+def run_query(args, out=None):
+    parser = build_query_parser()
+    try:
+        query = query_from_args(args)
+    except (ValueError, re.error) as e:
+        parser.error(str(e))
+
+    # 日付が変わるごとと最後に flush する（途中経過がすぐ見えるように）
+    out = io.TextIOWrapper(out or sys.stdout.buffer, encoding="utf-8", newline="")
+    writer = csv.writer(out, lineterminator="\n") if args.format == "csv" else None
+    if writer is not None:
+        writer.writerow(QUERY_COLUMNS)
+    day = None
+    last = None
+    try:
+        for n, hit in enumerate(query.run(args.archive, args.after), 1):
+            if hit.day != day:
+                out.flush()
+                day = hit.day
+            if writer is not None:
+                time = format_clock(hit.secs) if hit.secs >= 0 else hit.timestamp
+                writer.writerow((hit.day.replace("_", "-"), time, hit.channel, hit.speaker, hit.text,
+                                 format_cursor(hit)))
+            elif args.format == "jsonl":
+                out.write(hit_json(hit).decode("utf-8") + "\n")
+            else:
+                out.write(hit_text(hit) + "\n")
+            if n == args.limit:
+                last = hit
+                break
+        out.flush()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        # 標準出力そのものは閉じない
+        out.detach()
+
+    if last is not None:
+        print(f"続き: --after {format_cursor(last)}", file=sys.stderr)
+
+    # 読めなかった日は飛ばして続けたので、最後にまとめて知らせる
+    for day, error in query.errors:
+        print(f"読めない日を飛ばしました: {day.replace('_', '-')}（{error}）", file=sys.stderr)
+    return 1 if query.errors else 0
+
+
+# ============================================================
+#   過去ログ検索 API だけを動かす（python -m twchat api ...）
+# ============================================================
+#   python -m twchat api --archive history --port 8766
+#   ログは追わない。Ctrl+C で止める。
+
+
+def build_api_parser():
+    parser = argparse.ArgumentParser(prog="twchat api", description="過去ログ検索の HTTP API")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"待ち受けるポート（既定 {API_PORT}）")
+    parser.add_argument("--host", default=API_HOST, help=f"待ち受けるアドレス（既定 {API_HOST}）")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="履歴（バイナリログ・アーカイブ）のフォルダ")
+    return parser
+
+
+def run_api(args):
+    try:
+        api = QueryServer(args.archive, host=args.host, port=args.port)
+    except OSError as e:
+        print(f"検索 API を開始できません: {e}", file=sys.stderr)
+        return 1
+    print(f"検索 API: http://{api.host}:{api.port}/query", file=sys.stderr)
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server_close()
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["query"]:
+        return run_query(build_query_parser().parse_args(argv[1:]))
+    if argv[:1] == ["api"]:
+        return run_api(build_api_parser().parse_args(argv[1:]))
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.headless:
+        parser.error("GUI は chat_viewer_ver3.py から起動してください（ここでは --headless / query / api のみ）")
+    return run_headless(args)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+from .timestamps import DayClock
+
+# ============================================================
+#   発言者ごとの連投検出（トークンバケツ）
+# ============================================================
+#   発言者ごとに「1分あたり rate 件・最大 burst 件まで貯まる」バケツを持ち、
+#   空のときの発言は省略する。省略が始まったら半分まで貯まるまで省略を続ける。
+#   1件あたり O(1)。
+#   状態は直近に発言した max_speakers 人分だけ（古いものから捨てる）。
+#   省略中の発言者は active にも持つ（診断表示が UI スレッドから読むのはこちらの写しだけ）。
+FLOOD_RATE = 6
+FLOOD_BURST = 8
+FLOOD_SPEAKERS = 1024
+FLOOD_CHANNELS = ("一般", "叫ぶ")
+
+
+class FloodGuard:
+    def __init__(self, rate=FLOOD_RATE, burst=FLOOD_BURST, max_speakers=FLOOD_SPEAKERS,
+                 channels=FLOOD_CHANNELS):
+        self.rate = rate
+        self.burst = burst
+        self.max_speakers = max_speakers
+        self.channels = set(channels)
+        self.clear()
+
+    def clear(self):
+        # 発言者 → [残りトークン, 最後の時刻, 省略した件数, 省略行のメッセージ番号（省略中でなければ None）]
+        self.speakers = OrderedDict()
+        self.active = {}
+        self.clock = DayClock()
+        self.suppressed = 0
+        self.evicted = 0
+
+    def check(self, chat_type, speaker, secs):
+        # 表示してよければ None、連投中なら発言者の状態を返す
+        if self.rate <= 0 or not speaker or chat_type not in self.channels or secs < 0:
+            return None
+        t = self.clock.index(secs)
+
+        state = self.speakers.get(speaker)
+        if state is None:
+            state = self.speakers[speaker] = [float(self.burst), t, 0, None]
+            if len(self.speakers) > self.max_speakers:
+                name, _ = self.speakers.popitem(last=False)
+                self.active.pop(name, None)
+                self.evicted += 1
+        else:
+            self.speakers.move_to_end(speaker)
+            state[0] = min(self.burst, state[0] + (t - state[1]) * self.rate / 60)
+            state[1] = t
+
+        if state[0] >= (1 if state[3] is None else self.burst / 2):
+            state[0] -= 1
+            if state[3] is not None:
+                state[3] = None
+                self.active.pop(speaker, None)
+            return None
+
+        if state[3] is None:
+            state[3] = -1
+            self.active[speaker] = state
+        state[2] += 1
+        self.suppressed += 1
+        return state
+
+    def flooding(self):
+        # 現在省略中の発言者（省略件数の多い順）。取り込みスレッドが更新中でも読めるよう写しから
+        active = self.active.copy()
+        return sorted(((name, state[2]) for name, state in active.items()), key=lambda item: -item[1])
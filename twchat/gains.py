@@ -0,0 +1,146 @@
+import re
+from array import array
+
+from .timestamps import DayClock
+
+# ============================================================
+#   経験値 / ルーン経験値 / ELSO / ペット拾得の取得ログ
+# ============================================================
+#   "経験値が 12,345 上がりました。" のような行から数値を取り出す
+#   ペットの拾得は1行 = 1個として数える
+GAIN_PREFIXES = {
+    "経験値が": "exp",
+    "ルーン経験値が": "rune",
+    "[ELSO": "elso",
+    "ペットが": "pet",
+}
+GAIN_KINDS = ("exp", "rune", "elso", "pet")
+
+_NUMBER_RE = re.compile(r"\d[\d,]*")
+
+
+def parse_gain(text):
+    for prefix, kind in GAIN_PREFIXES.items():
+        if text.startswith(prefix):
+            if kind == "pet":
+                return kind, 1
+            m = _NUMBER_RE.search(text, len(prefix))
+            if m:
+                return kind, int(m.group().replace(",", ""))
+            return None
+    return None
+
+
+# ============================================================
+#   1分ごとの集計（直近 window 分のリングバッファ）
+# ============================================================
+#   取得1件あたりの更新は O(1)。古いバケツは時刻が進んだときにまとめて捨てる。
+#   書き換えるのは add()（取り込みスレッド）だけ。per_hour() は読むだけなので UI スレッドから呼べる。
+class RateTracker:
+    def __init__(self, window=60, kinds=GAIN_KINDS):
+        self.window = window
+        self.kinds = kinds
+        self.slot_minute = array("q", [-1] * window)
+        self.buckets = {kind: array("q", [0] * window) for kind in kinds}
+        self.totals = {kind: 0 for kind in kinds}
+        self.first_minute = -1
+        self.head = -1
+        self.clock = DayClock()
+
+    def _advance(self, minute):
+        # head より後ろ、minute までのバケツを空にする
+        if minute <= self.head:
+            return
+        start = max(self.head + 1, minute - self.window + 1)
+        for m in range(start, minute + 1):
+            slot = m % self.window
+            if self.slot_minute[slot] >= 0:
+                for kind in self.kinds:
+                    self.totals[kind] -= self.buckets[kind][slot]
+                    self.buckets[kind][slot] = 0
+            self.slot_minute[slot] = m
+        self.head = minute
+
+    def add(self, kind, amount, secs):
+        if secs < 0:
+            return
+        minute = self.clock.index(secs) // 60
+        if minute < self.head - self.window + 1:
+            return
+        self._advance(minute)
+        if self.first_minute < 0:
+            self.first_minute = minute
+        self.buckets[kind][minute % self.window] += amount
+        self.totals[kind] += amount
+
+    def per_hour(self, now_secs):
+        # 直近 window 分（記録開始からの方が短ければその分）の1時間あたりの量
+        if self.first_minute < 0:
+            return {kind: 0 for kind in self.kinds}
+        now = max(self.clock.peek(now_secs) // 60, self.head)
+        live = [slot for slot, minute in enumerate(self.slot_minute) if now - self.window < minute <= now]
+        span = min(self.window, max(1, now - self.first_minute + 1))
+        return {kind: sum(self.buckets[kind][slot] for slot in live) * 60 / span for kind in self.kinds}
+
+    def reset(self):
+        self.__init__(self.window, self.kinds)
+
+
+# ============================================================
+#   ELSO / ペット拾得の内訳（アイテムごとの累計）
+# ============================================================
+#   "[ELSO] 1,234 ELSOを獲得しました。" → ("elso", "ELSO", 1234)
+#   "ペットが「赤いポーション」を3個拾いました。" → ("pet", "赤いポーション", 3)
+LOOT_KINDS = ("elso", "pet")
+
+_PET_RE = re.compile(
+    r"^ペットが\s*[「『\[]?(.+?)[」』\]]?\s*(?:[x×]\s*(\d[\d,]*))?\s*を\s*(?:(\d[\d,]*)\s*個)?"
+)
+
+
+def parse_loot(text):
+    gain = parse_gain(text)
+    if gain is None or gain[0] not in LOOT_KINDS:
+        return None
+    kind, amount = gain
+    if kind == "elso":
+        return kind, "ELSO", amount
+    m = _PET_RE.match(text)
+    if not m:
+        return kind, "不明", 1
+    n = m.group(2) or m.group(3)
+    return kind, m.group(1).strip(), int(n.replace(",", "")) if n else 1
+
+
+class LootTracker:
+    def __init__(self):
+        self.items = {}
+        self.order = []
+        self.totals = {kind: 0 for kind in LOOT_KINDS}
+        self.first = -1
+        self.clock = DayClock()
+
+    def add(self, kind, item, amount, secs):
+        # 1件ごとに該当アイテムの累計だけを更新し、表示行の番号を返す
+        key = (kind, item)
+        entry = self.items.get(key)
+        if entry is None:
+            entry = self.items[key] = [len(self.order), 0, 0]
+            self.order.append(key)
+        entry[1] += 1
+        entry[2] += amount
+        self.totals[kind] += amount
+        if secs >= 0:
+            t = self.clock.index(secs)
+            if self.first < 0:
+                self.first = t
+        return entry[0]
+
+    def hours(self, now_secs):
+        # 最初の取得から今までの時間（最低1分）
+        if self.first < 0:
+            return 1 / 60
+        return max(self.clock.peek(now_secs) - self.first, 60) / 3600
+
+    def reset(self):
+        self.__init__()
@@ -0,0 +1,29 @@
+# ============================================================
+#   監視間隔の調整（変化がなければ間隔を倍々に広げる）
+# ============================================================
+#   ファイルがない・増えていないあいだは min_delay から max_delay まで倍々に待ち、
+#   変化を見つけたら reset() で min_delay に戻す。
+POLL_MIN = 0.25
+POLL_IDLE_MAX = 4.0
+POLL_MISSING_MAX = 30.0
+
+
+class Backoff:
+    def __init__(self, min_delay=POLL_MIN, max_delay=POLL_IDLE_MAX):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+        self.state = "active"
+
+    def reset(self):
+        self.delay = self.min_delay
+        self.state = "active"
+
+    def next(self, state="idle", max_delay=None):
+        # 今回待つ秒数を返し、次回の間隔を倍にする
+        if state != self.state:
+            self.state = state
+            self.delay = self.min_delay
+        delay = self.delay
+        self.delay = min(self.delay * 2, max_delay or self.max_delay)
+        return delay
@@ -0,0 +1,386 @@
+import asyncio
+import html
+import inspect
+import os
+import re
+import time
+from collections import namedtuple
+from contextlib import aclosing
+
+from .channels import CHAT_COLORS, EXCLUDE_PATTERNS, LOOT_PATTERNS
+from .idle import POLL_MISSING_MAX, Backoff
+from .speakers import split_speaker
+from .timestamps import parse_timestamp
+
+# ============================================================
+#   取り込みの中核（Tk なし・asyncio）
+# ============================================================
+#   tail_chunks → parse → classify の各段を非同期イテレータでつなぎ、
+#   できたまとまり(Batch)を登録された出力先(sink)と購読者(subscribe)へ配る。
+#   スクリプトや計測からは同期版の iter_records / tail をそのまま使える。
+#
+#   Chunk  : ログファイルに増えた分のバイト列
+#   Batch  : 1回の読み込み分のメッセージ。end はここまで取り込んだバイト位置
+#            live は開いた直後の読み込み（過去分）なら False
+#   Record : 1メッセージ。offset はログファイル内のバイト位置
+DAY_FORMAT = "%Y_%m_%d"
+LOG_ENCODING = "cp932"
+SUBSCRIBER_QUEUE = 64
+READ_BLOCK = 1 << 20
+
+Chunk = namedtuple("Chunk", "path day offset data live")
+Batch = namedtuple("Batch", "path day end live records")
+Record = namedtuple("Record", "channel timestamp text secs speaker offset")
+
+
+_DAY_RE = re.compile(r"TWChatLog_(\d{4}_\d{2}_\d{2})")
+
+
+def log_path(folder, day):
+    return os.path.join(folder, f"TWChatLog_{day}.html")
+
+
+def log_day(path):
+    m = _DAY_RE.search(os.path.basename(path))
+    return m.group(1) if m else ""
+
+
+async def _sleep(seconds):
+    await asyncio.sleep(seconds)
+    return False
+
+
+# ============================================================
+#   tail_chunks : 今日のログファイルに増えた分を読む
+# ============================================================
+#   folder は文字列か、呼ぶたびにフォルダを返す関数（途中で変えられるように）
+#   open_file(path, day, size) は新しいファイルを開いたときに呼び、読み始める位置を返す
+#   wait(seconds) が True を返したら終わる
+#   開く・読むのに失敗しても（消された・ロックされた・履歴が壊れていた）止まらず、間隔を広げてやり直す
+async def tail_chunks(folder, open_file=None, backoff=None, wait=_sleep):
+    backoff = backoff or Backoff()
+    backoff.reset()
+    path = None
+    offset = None
+
+    while True:
+        day = time.strftime(DAY_FORMAT)
+        expected = log_path(folder() if callable(folder) else folder, day)
+        if expected != path:
+            path = expected
+            offset = None
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # ログがない（ゲーム未起動・ログ出力オフ）あいだは確認の間隔を広げていく
+            if await wait(backoff.next("missing", POLL_MISSING_MAX)):
+                return
+            continue
+
+        if offset is None:
+            try:
+                offset = open_file(path, day, size) if open_file else 0
+            except Exception as e:
+                print("エラー:", e)
+                if await wait(backoff.next("error", POLL_MISSING_MAX)):
+                    return
+                continue
+            # 開いた時点までに書かれていた分は過去分（live=False）
+            backlog = size
+        if size < offset:
+            # 同じ名前で作り直された
+            offset = backlog = 0
+
+        delay = backoff.min_delay
+        if size > offset:
+            backoff.reset()
+            # 大きなファイルは READ_BLOCK ずつ、待たずに続けて読む
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(min(size - offset, READ_BLOCK))
+            except OSError as e:
+                print("エラー:", e)
+                if await wait(backoff.next("error", POLL_MISSING_MAX)):
+                    return
+                continue
+            yield Chunk(path, day, offset, data, offset >= backlog)
+            offset += len(data)
+            if offset < size:
+                continue
+        else:
+            # 変化がなければ間隔を広げる（増えたらすぐ元に戻る）
+            delay = backoff.next("idle")
+
+        if await wait(delay):
+            return
+
+
+# ============================================================
+#   parse : <font>時刻</font><font color=...>本文</font> の組を取り出す
+# ============================================================
+#   バイト列のまま探す（cp932 の2バイト目に "<" ">" は来ないので、タグの境目は崩れない）。
+#   書き込み途中で組が揃っていない分は次の読み込みに回し、end には含めない。
+_FONT_RE = re.compile(rb"<font\b([^>]*)>(.*?)</font\s*>", re.I | re.S)
+_COLOR_RE = re.compile(rb"""color\s*=\s*["']?([^"'\s>]+)""", re.I)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _font_text(raw):
+    return html.unescape(_TAG_RE.sub("", raw.decode(LOG_ENCODING, errors="ignore"))).strip()
+
+
+def parse_chunk(data, offset=0):
+    # 戻り値 : ([(色, 時刻, 本文, バイト位置), ...], 取り込んだバイト数)
+    lines = []
+    fonts = list(_FONT_RE.finditer(data))
+    for i in range(0, len(fonts) - 1, 2):
+        time_font, chat_font = fonts[i], fonts[i + 1]
+        m = _COLOR_RE.search(chat_font.group(1))
+        color = m.group(1).decode("ascii", errors="ignore").lower() if m else ""
+        lines.append((color, _font_text(time_font.group(2)), _font_text(chat_font.group(2)),
+                      offset + time_font.start()))
+    if len(fonts) % 2:
+        return lines, fonts[-1].start()
+    return lines, fonts[-1].end() if fonts else 0
+
+
+class ChunkParser:
+    # 組が揃わなかった末尾を持ち越しながら Chunk → Batch（中身は parse_chunk の行）
+    def __init__(self):
+        self.path = None
+        self.pending = b""
+
+    def feed(self, chunk):
+        if chunk.path != self.path:
+            self.path = chunk.path
+            self.pending = b""
+        start = chunk.offset - len(self.pending)
+        data = self.pending + chunk.data
+        lines, used = parse_chunk(data, start)
+        self.pending = data[used:]
+        return Batch(chunk.path, chunk.day, start + used, chunk.live, lines)
+
+
+async def parse(chunks):
+    parser = ChunkParser()
+    # 途中でやめたときは前の段も閉じる
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            yield parser.feed(chunk)
+
+
+# ============================================================
+#   classify : 色 → 種別、発言者の切り出し、時刻の解析
+# ============================================================
+#   colors は {色: (種別, 表示色)}。知らない色の行は捨てる。
+#   除外ログは捨てずに Record にし、表示するかどうかは accepts() で決める
+#   （履歴や集計には除外ログも要るため）。
+class Classifier:
+    def __init__(self, colors=CHAT_COLORS, exclude_options=None):
+        self.colors = colors
+        exclude_options = exclude_options or {}
+        self.hidden = tuple(
+            pat for pat in EXCLUDE_PATTERNS + LOOT_PATTERNS if not exclude_options.get(pat, False)
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        # settings.json の内容（dict）から
+        return cls(exclude_options=settings.get("exclude_options", {}))
+
+    def channel(self, color):
+        entry = self.colors.get(color.lower())
+        return entry[0] if entry is not None else None
+
+    def record(self, color, timestamp, text, offset=-1):
+        channel = self.channel(color)
+        if channel is None:
+            return None
+        speaker, _ = split_speaker(channel, text)
+        return Record(channel, timestamp, text, parse_timestamp(timestamp), speaker, offset)
+
+    def accepts(self, record):
+        return not record.text.startswith(self.hidden)
+
+    def batch(self, batch):
+        records = []
+        for line in batch.records:
+            record = self.record(*line)
+            if record is not None:
+                records.append(record)
+        return batch._replace(records=records)
+
+
+async def classify(batches, classifier=None):
+    classifier = classifier or Classifier()
+    async with aclosing(batches):
+        async for batch in batches:
+            yield classifier.batch(batch)
+
+
+# ============================================================
+#   購読（非同期イテレータ）
+# ============================================================
+#   async for batch in core.subscribe(): ...
+#   キューがいっぱいのあいだは中核の側が待つ（取りこぼさない）
+class Subscription:
+    def __init__(self, core, maxsize=SUBSCRIBER_QUEUE):
+        self.core = core
+        self.queue = asyncio.Queue(maxsize)
+        self.done = False
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed or (self.done and self.queue.empty()):
+            raise StopAsyncIteration
+        batch = await self.queue.get()
+        if batch is None:
+            raise StopAsyncIteration
+        return batch
+
+    def finish(self):
+        self.done = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    def close(self):
+        if self in self.core.subscribers:
+            self.core.subscribers.remove(self)
+        self.done = self.closed = True
+        if self.queue.full():
+            # 中核が put() で待っているかもしれないので空けて先へ進ませる（もう読まない）
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        else:
+            # get() で待っている読み手を起こす
+            self.queue.put_nowait(None)
+
+
+class IngestCore:
+    def __init__(self, folder, classifier=None, open_file=None, backoff=None):
+        self.folder = folder
+        self.classifier = classifier or Classifier()
+        self.open_file = open_file
+        self.backoff = backoff or Backoff()
+        self.sinks = []
+        self.subscribers = []
+        self.loop = None
+        self.stopping = asyncio.Event()
+        self.stopped = False
+        self.batches = 0
+        self.records = 0
+
+    def add_sink(self, sink):
+        # sink(batch) は中核のスレッドで呼ぶ。コルーチン関数でもよい
+        self.sinks.append(sink)
+        return sink
+
+    def subscribe(self, maxsize=SUBSCRIBER_QUEUE):
+        sub = Subscription(self, maxsize)
+        self.subscribers.append(sub)
+        return sub
+
+    def stop(self):
+        # どのスレッドから呼んでもよい
+        self.stopped = True
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.stopping.set)
+            except RuntimeError:
+                pass
+
+    async def wait(self, seconds):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self.stopping.is_set()
+
+    def stream(self):
+        chunks = tail_chunks(self.folder, self.open_file, self.backoff, self.wait)
+        return classify(parse(chunks), self.classifier)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        if self.stopped:
+            self.stopping.set()
+        try:
+            async for batch in self.stream():
+                self.batches += 1
+                self.records += len(batch.records)
+                for sink in self.sinks:
+                    try:
+                        result = sink(batch)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as e:
+                        print("エラー:", e)
+                for sub in list(self.subscribers):
+                    await sub.queue.put(batch)
+                if self.stopping.is_set():
+                    break
+        finally:
+            for sub in self.subscribers:
+                sub.finish()
+
+
+# ============================================================
+#   同期 API（スクリプト・計測用）
+# ============================================================
+def iter_records(path, start=0, classifier=None, block=READ_BLOCK):
+    # ログファイル1つを start バイト目から最後まで読み、Record を1件ずつ返す
+    classifier = classifier or Classifier()
+    parser = ChunkParser()
+    day = log_day(path)
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        while True:
+            data = f.read(block)
+            if not data:
+                return
+            yield from classifier.batch(parser.feed(Chunk(path, day, offset, data, False))).records
+            offset += len(data)
+
+
+def _iterate(agen):
+    # 非同期イテレータを専用のイベントループで1つずつ進める
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def tail_batches(folder, from_start=False, classifier=None, backoff=None):
+    # 今日のログを追い続けて Batch を返す（ブロックする。やめるときはジェネレータを閉じる）
+    # 最初のファイルは from_start でなければ末尾から。日付が変わった後のファイルは先頭から読む
+    opened = []
+
+    def open_file(path, day, size):
+        first = not opened
+        opened.append(path)
+        return size if first and not from_start else 0
+
+    chunks = tail_chunks(folder, open_file, backoff)
+    return _iterate(classify(parse(chunks), classifier))
+
+
+def tail(folder, from_start=False, classifier=None, backoff=None):
+    for batch in tail_batches(folder, from_start, classifier, backoff):
+        yield from batch.records
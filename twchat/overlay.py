@@ -0,0 +1,260 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from collections import deque
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+# ============================================================
+#   オーバーレイ配信（ブラウザ / OBS のブラウザソース向け）
+# ============================================================
+#   localhost で待ち受け、メッセージを Server-Sent Events (/events) か
+#   WebSocket (/ws) で配る。/ は表示用のページ。
+#
+#   メッセージは publish() の時点で1回だけ JSON にし、SSE と WebSocket の
+#   フレームにして共有バッファ（OVERLAY_BUFFER 件のリング）に積む。
+#   各接続は自分の読み位置だけを持ち、送れた分だけ進む。遅い接続はその接続の
+#   コルーチンが待つだけで、取り込みや UI は待たない。バッファから落ちるほど
+#   遅れた接続は古い分を飛ばす（dropped に数える）。
+#
+#   耳打ちも流れるので、/events と /ws は他のサイトのページからは読ませない
+#   （Origin ヘッダがあれば自分のページ http://127.0.0.1:<port> / http://localhost:<port> だけ）。
+OVERLAY_HOST = "127.0.0.1"
+OVERLAY_PORT = 8765
+OVERLAY_BUFFER = 2048
+OVERLAY_REPLAY = 50
+KEEPALIVE = 15.0
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OVERLAY_PAGE = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>TW チャット</title>
+<style>
+body { margin: 0; background: transparent; font: 16px Meiryo, sans-serif; text-shadow: 1px 1px 2px #000; }
+#log { position: fixed; bottom: 0; left: 0; right: 0; padding: 4px 8px; }
+#log div { white-space: pre-wrap; word-break: break-all; }
+</style></head><body><div id="log"></div>
+<script>
+// ?ch=耳打ち&ch=チーム で種別を絞り込み、?max=30 で表示行数
+const params = new URLSearchParams(location.search);
+const max = parseInt(params.get("max") || "30");
+const log = document.getElementById("log");
+new EventSource("/events" + location.search).onmessage = (e) => {
+  const m = JSON.parse(e.data);
+  const div = document.createElement("div");
+  div.style.color = m.color;
+  div.textContent = m.text;
+  log.appendChild(div);
+  while (log.children.length > max) log.removeChild(log.firstChild);
+};
+</script></body></html>
+"""
+
+
+def _ws_frame(payload):
+    # サーバー → クライアントのテキストフレーム（マスクなし）
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x81, n)
+    elif n < 1 << 16:
+        head = struct.pack("!BBH", 0x81, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x81, 127, n)
+    return head + payload
+
+
+def _ws_accept(key):
+    return base64.b64encode(hashlib.sha1(key.encode("ascii") + _WS_GUID).digest()).decode("ascii")
+
+
+class OverlayServer:
+    def __init__(self, host=OVERLAY_HOST, port=OVERLAY_PORT, buffer=OVERLAY_BUFFER):
+        self.host = host
+        self.port = port
+        self.frames = deque(maxlen=buffer)
+        self.head = 0
+        self.clients = 0
+        self.sent = 0
+        self.dropped = 0
+        self.loop = None
+        self.thread = None
+        self.server = None
+        self.stopping = None
+        self.tick = None
+
+    @property
+    def running(self):
+        return self.server is not None
+
+    def allowed_origin(self, origin):
+        # Origin なし（curl などブラウザ以外から）はよい
+        if not origin:
+            return True
+        return origin in {f"http://{host}:{self.port}" for host in (self.host, "127.0.0.1", "localhost")}
+
+    # ============================================================
+    #   配信（どのスレッドから呼んでもよい）
+    # ============================================================
+    @staticmethod
+    def encode(chat_type, text, color="white", timestamp="", speaker=""):
+        data = json.dumps({
+            "time": timestamp, "channel": chat_type, "speaker": speaker, "text": text, "color": color,
+        }, ensure_ascii=False).encode("utf-8")
+        return chat_type, b"data: " + data + b"\n\n", _ws_frame(data)
+
+    def publish(self, chat_type, text, color="white", timestamp="", speaker=""):
+        self.publish_frames([self.encode(chat_type, text, color, timestamp, speaker)])
+
+    def publish_frames(self, frames):
+        # まとめて渡すとイベントループを起こすのが1回で済む
+        loop = self.loop
+        if loop is None or not frames:
+            return
+        try:
+            loop.call_soon_threadsafe(self._append, frames)
+        except RuntimeError:
+            pass
+
+    def _append(self, frames):
+        self.frames.extend(frames)
+        self.head += len(frames)
+        tick, self.tick = self.tick, self.loop.create_future()
+        tick.set_result(None)
+
+    # ============================================================
+    #   起動・停止（別スレッドで専用のイベントループを回す）
+    # ============================================================
+    def start(self):
+        # 待ち受けを始めるまで待つ。ポートが使えなければ OSError
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.serve(ready))
+            except OSError as e:
+                errors.append(e)
+            finally:
+                ready.set()
+
+        self.thread = threading.Thread(target=run, name="overlay", daemon=True)
+        self.thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+
+    def stop(self):
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.stopping.set)
+            except RuntimeError:
+                pass
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1.0)
+
+    async def serve(self, ready=None):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.tick = loop.create_future()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.loop = loop
+        if ready is not None:
+            ready.set()
+        try:
+            await self.stopping.wait()
+        finally:
+            self.loop = None
+            self.server.close()
+            self.server = None
+
+    # ============================================================
+    #   接続ごとの処理
+    # ============================================================
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = head.decode("utf-8", errors="replace").split("\r\n")
+        parts = lines[0].split(" ")
+        target = urlsplit(parts[1] if len(parts) > 1 else "/")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        channels = set(parse_qs(target.query).get("ch", ()))
+
+        try:
+            if target.path in ("/events", "/ws") and not self.allowed_origin(headers.get("origin")):
+                writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+            elif target.path == "/events":
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                             b"Cache-Control: no-cache\r\n\r\n")
+                await self.pump(reader, writer, 1, channels, b": ping\n\n")
+            elif target.path == "/ws" and "sec-websocket-key" in headers:
+                accept = _ws_accept(headers["sec-websocket-key"])
+                writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept.encode("ascii") + b"\r\n\r\n")
+                await self.pump(reader, writer, 2, channels, b"\x89\x00")
+            elif target.path == "/":
+                body = OVERLAY_PAGE.encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+                await writer.drain()
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def pump(self, reader, writer, kind, channels, keepalive):
+        # kind : frames の要素のうち送る方（1 = SSE、2 = WebSocket）
+        self.clients += 1
+        closed = asyncio.ensure_future(self._drain_input(reader))
+        stopped = asyncio.ensure_future(self.stopping.wait())
+        cursor = max(self.head - OVERLAY_REPLAY, self.head - len(self.frames))
+        try:
+            while not closed.done():
+                if cursor >= self.head:
+                    done, _ = await asyncio.wait(
+                        (self.tick, closed, stopped),
+                        timeout=KEEPALIVE, return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if self.stopping.is_set():
+                        return
+                    if not done:
+                        writer.write(keepalive)
+                        await writer.drain()
+                    continue
+
+                oldest = self.head - len(self.frames)
+                if cursor < oldest:
+                    self.dropped += oldest - cursor
+                    cursor = oldest
+                batch = [f[kind] for f in islice(self.frames, cursor - oldest, None)
+                         if not channels or f[0] in channels]
+                cursor = self.head
+                if batch:
+                    writer.write(b"".join(batch))
+                    self.sent += len(batch)
+                    # 遅い接続はここで待つ（この接続だけ）
+                    await writer.drain()
+        finally:
+            self.clients -= 1
+            closed.cancel()
+            stopped.cancel()
+
+    async def _drain_input(self, reader):
+        # 相手の送信は読み捨て、切断（EOF）を待つ
+        while await reader.read(4096):
+            pass
@@ -0,0 +1,164 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+# ============================================================
+#   取り込み → 画面 の受け渡し（優先 / 通常の2レーン）
+# ============================================================
+#   取り込みスレッドは描画の依頼をレーンに積むだけで、描画は UI スレッドがまとめて行う。
+#   優先（耳打ち・SP・通知）は次のフレームで、通常（一般・システムなど）は
+#   FlushController が決めた間隔と件数でまとめて描く。
+PRIORITY = "priority"
+BULK = "bulk"
+
+FRAME_MS = 16
+BULK_MS = 100
+BULK_BATCH = 500
+
+
+class RenderLanes:
+    def __init__(self):
+        self.lanes = {PRIORITY: deque(), BULK: deque()}
+        self.pending = {PRIORITY: False, BULK: False}
+        self.lock = threading.Lock()
+
+    def push(self, op, lane=BULK):
+        # 戻り値: 新たに描画の予約が必要なレーン（予約済みなら None）
+        self.lanes[lane].append(op)
+        with self.lock:
+            if self.pending[lane]:
+                return None
+            self.pending[lane] = True
+            return lane
+
+    def take(self, lane, limit=None):
+        # レーンから最大 limit 件を取り出す。残りがあれば予約済みのまま
+        queue = self.lanes[lane]
+        with self.lock:
+            self.pending[lane] = False
+        n = len(queue) if limit is None else min(limit, len(queue))
+        ops = [queue.popleft() for _ in range(n)]
+        if queue:
+            with self.lock:
+                self.pending[lane] = True
+        return ops, bool(queue)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.lanes.values())
+
+    def clear(self):
+        for queue in self.lanes.values():
+            queue.clear()
+
+    def drop(self, kind):
+        # 種類が kind の依頼だけを捨てる（取り込み側のロックを持って呼ぶ）
+        for queue in self.lanes.values():
+            kept = [op for op in queue if op[0] != kind]
+            queue.clear()
+            queue.extend(kept)
+
+
+# ============================================================
+#   UI スレッドへの予約を出すスレッド
+# ============================================================
+#   Tk は別スレッドから呼ぶと UI スレッドが応じるまでその場で待つ。取り込みスレッドが
+#   そこで待つと、UI スレッドの停止待ち（join）やロック待ちと噛み合って固まるので、
+#   取り込みスレッドは call() でキューに積むだけにして、予約はこのスレッドが出す。
+#   call_later(delay_ms, fn, *args) は root.after など。
+class UiDispatcher:
+    def __init__(self, call_later, name="ui-dispatch"):
+        self.call_later = call_later
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def call(self, delay_ms, fn, *args):
+        self.queue.put((delay_ms, fn, args))
+
+    def close(self):
+        self.closed = True
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            delay_ms, fn, args = item
+            while not self.closed:
+                try:
+                    self.call_later(delay_ms, fn, *args)
+                    break
+                except RuntimeError:
+                    # mainloop がまだ始まっていない
+                    time.sleep(FRAME_MS / 1000)
+                except Exception:
+                    # ウィンドウが閉じられた
+                    return
+
+
+# ============================================================
+#   通常レーンの描画間隔・件数の調整
+# ============================================================
+#   流入量（件/秒）と1行あたりの描画時間を測り、
+#   静かなときはすぐ描き、流入が多いほど間隔を空けて（最大 BULK_MS）まとめて描く。
+#   1回に描く件数は FRAME_BUDGET_MS に収まる分（流入に追いつけなければその分増やす）。
+QUIET_RATE = 5
+FLOOD_RATE = 200
+FRAME_BUDGET_MS = 8
+MIN_BATCH = 50
+RATE_TAU = 1.0
+
+
+class FlushController:
+    def __init__(self):
+        self.rate = 0.0
+        self.cost_ms = 0.05
+        self.window_start = time.perf_counter()
+        self.window_count = 0
+        self.flushes = 0
+        self.lines = 0
+        self.last_lines = 0
+        self.last_ms = 0.0
+
+    def arrived(self):
+        # 取り込みスレッドから1件ごとに呼ぶ。0.1秒ごとに流入量を指数平滑
+        self.window_count += 1
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed >= 0.1:
+            alpha = 1 - math.exp(-elapsed / RATE_TAU)
+            self.rate += alpha * (self.window_count / elapsed - self.rate)
+            self.window_start = now
+            self.window_count = 0
+
+    def current_rate(self):
+        # しばらく流入がなければ、その分だけ下げて見る
+        idle = time.perf_counter() - self.window_start
+        if idle < 0.1:
+            return self.rate
+        return self.rate * math.exp(-idle / RATE_TAU) + self.window_count / idle * (1 - math.exp(-idle / RATE_TAU))
+
+    def delay_ms(self):
+        rate = self.current_rate()
+        if rate < QUIET_RATE:
+            return 0
+        if rate >= FLOOD_RATE:
+            return BULK_MS
+        return int(FRAME_MS + (BULK_MS - FRAME_MS) * (rate - QUIET_RATE) / (FLOOD_RATE - QUIET_RATE))
+
+    def batch_size(self):
+        # 描画時間の目安に収まる件数。ただし流入に追いつけるだけは描く
+        backlog = self.current_rate() * max(self.delay_ms(), FRAME_MS) / 1000 * 1.5
+        return max(MIN_BATCH, min(BULK_BATCH * 10, max(int(FRAME_BUDGET_MS / self.cost_ms), int(backlog))))
+
+    def record(self, lines, elapsed_ms):
+        self.flushes += 1
+        self.lines += lines
+        self.last_lines = lines
+        self.last_ms = elapsed_ms
+        if lines:
+            self.cost_ms += 0.2 * (elapsed_ms / lines - self.cost_ms)
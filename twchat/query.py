@@ -0,0 +1,146 @@
+import glob
+import lzma
+import os
+import re
+import struct
+import zlib
+from collections import namedtuple
+
+from .archive import ARCHIVE_DIR, ArchiveReader, archive_path, normalize
+from .binlog import BinaryLogReader, log_paths
+from .speakers import split_speaker
+from .timestamps import parse_clock
+
+# ============================================================
+#   過去ログの検索（圧縮アーカイブ + まだ圧縮していないバイナリログ）
+# ============================================================
+#   日付は "2026_10_19"（ファイル名と同じ形）で扱う。
+#   アーカイブの日はブロックの時刻範囲・種別件数・ブルームフィルタ・発言者索引で
+#   関係ないブロックを展開せずに飛ばす。今日など圧縮前の日はバイナリログを
+#   時刻索引で読み始めの位置を決めてから順に読む。HTML は読まない。
+#
+#   結果は日付順・その日のレコード番号順。cursor "<日付>:<番号>" を渡すと
+#   その続きから返す（ページ送り）。
+#   読めない日（壊れたファイルなど）は飛ばして errors に (日付, 理由) を積み、検索は続ける。
+Hit = namedtuple("Hit", "day record channel timestamp text secs speaker")
+
+READ_ERRORS = (OSError, ValueError, EOFError, IndexError, struct.error, zlib.error, lzma.LZMAError)
+
+_DAY_RE = re.compile(r"^\s*(\d{4})\D?(\d{1,2})\D?(\d{1,2})\s*")
+
+
+def parse_day(text):
+    # "2026-10-19" / "2026/10/19" / "2026_10_19" / "20261019" → ("2026_10_19", 残りの文字列)
+    m = _DAY_RE.match(text)
+    if not m:
+        raise ValueError(f"日付が読めません: {text}")
+    y, mo, d = (int(v) for v in m.groups())
+    if not (1 <= mo <= 12 and 1 <= d <= 31):
+        raise ValueError(f"日付が読めません: {text}")
+    return f"{y:04d}_{mo:02d}_{d:02d}", text[m.end():]
+
+
+def parse_moment(text, end=False):
+    # "2026-10-19" / "2026-10-19 21:30" → (日付, 0時からの秒数)。時刻がなければその日の始め（end なら終わり）
+    day, rest = parse_day(text)
+    rest = rest.lstrip("T ")
+    if not rest:
+        return day, 86399 if end else 0
+    secs = parse_clock(rest)
+    if secs < 0:
+        raise ValueError(f"時刻が読めません: {rest}")
+    return day, secs
+
+
+def parse_cursor(cursor):
+    day, _, record = cursor.rpartition(":")
+    try:
+        return parse_day(day)[0], int(record)
+    except ValueError:
+        raise ValueError(f"cursor が読めません: {cursor}") from None
+
+
+def format_cursor(hit):
+    return f"{hit.day}:{hit.record}"
+
+
+def list_days(folder=ARCHIVE_DIR):
+    # 検索できる日付（アーカイブとバイナリログの両方にあればアーカイブを使う）
+    days = set()
+    for pattern in ("*.twarc", "*.twlog"):
+        for path in glob.glob(os.path.join(folder, pattern)):
+            days.add(os.path.splitext(os.path.basename(path))[0])
+    return sorted(days)
+
+
+class ChatQuery:
+    def __init__(self, since=None, until=None, channels=None, speaker=None, term=None, regex=None):
+        # since / until は (日付, 秒数) か None。channels は種別の集合か None
+        self.since = since
+        self.until = until
+        self.channels = set(channels) if channels else None
+        self.speaker = speaker or None
+        self.term = term or None
+        self.needle = normalize(term) if term else None
+        self.pattern = re.compile(regex) if regex else None
+        self.errors = []
+
+    def days(self, folder):
+        lo = self.since[0] if self.since else ""
+        hi = self.until[0] if self.until else "9999"
+        return [day for day in list_days(folder) if lo <= day <= hi]
+
+    def bounds(self, day):
+        start = self.since[1] if self.since and day == self.since[0] else None
+        end = self.until[1] if self.until and day == self.until[0] else None
+        return start, end
+
+    def matches(self, channel, text, secs, start, end):
+        # バイナリログ用（アーカイブは scan の中で同じ判定をする）
+        if self.channels is not None and channel not in self.channels:
+            return False
+        if start is not None and secs < start:
+            return False
+        if end is not None and secs > end:
+            return False
+        if self.speaker and split_speaker(channel, text)[0] != self.speaker:
+            return False
+        if self.needle and self.needle not in normalize(text):
+            return False
+        return True
+
+    def run(self, folder=ARCHIVE_DIR, cursor=None):
+        after_day, after = parse_cursor(cursor) if cursor else ("", -1)
+        for day in self.days(folder):
+            if day < after_day:
+                continue
+            skip = after if day == after_day else -1
+            start, end = self.bounds(day)
+            path = archive_path(folder, day)
+            if os.path.exists(path):
+                hits = self._scan_archive(path, skip, start, end)
+            else:
+                hits = self._scan_log(log_paths(folder, day)[0], skip, start, end)
+            try:
+                for n, (channel, timestamp, text, secs) in hits:
+                    if self.pattern is not None and not self.pattern.search(text):
+                        continue
+                    yield Hit(day, n, channel, timestamp, text, secs, split_speaker(channel, text)[0])
+            except READ_ERRORS as e:
+                self.errors.append((day, str(e) or type(e).__name__))
+
+    def _scan_archive(self, path, after, start, end):
+        with ArchiveReader(path) as reader:
+            yield from reader.scan(self.channels, start, end, self.term, self.speaker, after)
+
+    def _scan_log(self, path, after, start, end):
+        with BinaryLogReader(path) as reader:
+            first = reader.seek_time(start) if start is not None else 0
+            first = max(first, after + 1)
+            for n, record in enumerate(reader.iter_from(first), first):
+                channel, _, text, secs = record
+                # 書かれた順（ほぼ時刻順）なので、end を過ぎたらその日の残りは読まない
+                if end is not None and secs > end:
+                    break
+                if self.matches(channel, text, secs, start, end):
+                    yield n, record
@@ -0,0 +1,55 @@
+import re
+import unicodedata
+from collections import deque
+
+from .timestamps import DayClock
+
+# ============================================================
+#   同じ内容の繰り返し（宣伝の叫びやシステムのお知らせ）をまとめる
+# ============================================================
+#   (種別, 正規化した本文) のハッシュ値 → 最初に表示したメッセージ番号。
+#   最初の表示から window 秒のあいだに来た同じ内容は、その行の ×N に数える。
+#   期限切れは追加順の deque から先頭だけを見て捨てるので1件あたり O(1)。
+REPEAT_WINDOW = 300
+REPEAT_CHANNELS = ("叫ぶ", "システム")
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_repeat(text):
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+class RepeatCollapser:
+    def __init__(self, window=REPEAT_WINDOW, channels=REPEAT_CHANNELS):
+        self.window = window
+        self.channels = set(channels)
+        self.entries = {}
+        self.expiry = deque()
+        self.clock = DayClock()
+        self.now = 0
+        self.collapsed = 0
+
+    def lookup(self, chat_type, text, secs):
+        # 戻り値: (ハッシュ値, まとめ先のメッセージ番号)。対象外なら (None, None)
+        if self.window <= 0 or chat_type not in self.channels or secs < 0:
+            return None, None
+        self.now = self.clock.index(secs)
+        while self.expiry and self.expiry[0][0] <= self.now:
+            expires, key = self.expiry.popleft()
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == expires:
+                del self.entries[key]
+
+        key = hash((chat_type, normalize_repeat(text)))
+        entry = self.entries.get(key)
+        return key, entry[0] if entry is not None else None
+
+    def add(self, key, seq):
+        expires = self.now + self.window
+        self.entries[key] = (seq, expires)
+        self.expiry.append((expires, key))
+
+    def clear(self):
+        self.entries.clear()
+        self.expiry.clear()
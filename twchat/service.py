@@ -0,0 +1,88 @@
+import threading
+
+# ============================================================
+#   読み込みスレッドの管理
+# ============================================================
+#   start() のたびに世代番号を1つ進め、古いスレッドには停止を知らせる。
+#   スレッドは token.wait() で待つので、停止はすぐ伝わる。
+#   start() は UI スレッドから呼ばれるので、古いスレッドの終わりは数ミリ秒しか待たない。
+#   残った古いスレッドの出力は token.emit() を通すので世代が古ければ捨てられ、
+#   同じ行が二重に入ることはない。
+STOP_TIMEOUT = 0.5
+HANDOFF_TIMEOUT = 0.005
+
+
+class WorkerToken:
+    def __init__(self, service, generation):
+        self.service = service
+        self.generation = generation
+        self.stop_event = threading.Event()
+        self.callbacks = []
+
+    def stopped(self):
+        return self.stop_event.is_set() or self.generation != self.service.generation
+
+    def wait(self, seconds):
+        # seconds 待つ。途中で停止を知らされたら True
+        return self.stop_event.wait(seconds) or self.stopped()
+
+    def on_stop(self, fn):
+        # 停止を知らされたときに呼ぶ（別のイベントループへの橋渡しなど）
+        self.callbacks.append(fn)
+        if self.stop_event.is_set():
+            fn()
+
+    def cancel(self):
+        self.stop_event.set()
+        for fn in list(self.callbacks):
+            fn()
+
+    def emit(self, fn, *args):
+        # 現役の世代のときだけ fn を呼ぶ（古い世代の出力は捨てる）
+        # fn はデータの更新だけにする。ロック中に Tk を呼ぶと、UI スレッドが
+        # stop() の join やこのロックを待っているときに互いに待ち合って固まる
+        with self.service.lock:
+            if self.stopped():
+                return False
+            fn(*args)
+            return True
+
+
+class ReaderService:
+    def __init__(self, target, name="reader"):
+        self.target = target
+        self.name = name
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.token = None
+        self.thread = None
+        self.stale = 0
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.token.stopped()
+
+    def start(self, *args):
+        # 前の世代には停止を知らせるだけで、終わるのは待たずに始める
+        self.stop(HANDOFF_TIMEOUT)
+        with self.lock:
+            self.generation += 1
+            self.token = WorkerToken(self, self.generation)
+        self.thread = threading.Thread(
+            target=self.target, args=(self.token, *args),
+            name=f"{self.name}-{self.generation}", daemon=True
+        )
+        self.thread.start()
+        return self.generation
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        # 停止を知らせて timeout 秒だけ待つ。終わらなければ古い世代として放っておく
+        if self.token is None:
+            return True
+        self.token.cancel()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.stale += 1
+            return False
+        return True
@@ -0,0 +1,26 @@
+import json
+import os
+
+# ============================================================
+#   設定ファイル.json
+# ============================================================
+SETTINGS_FILE = "settings.json"
+DEFAULT_FOLDER = "C:\\Nexon\\TalesWeaver\\ChatLog"
+
+
+def load_settings(path=SETTINGS_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def save_settings(data, path=SETTINGS_FILE):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+    except:
+        print("設定保存エラー")
@@ -0,0 +1,136 @@
+import re
+import unicodedata
+from array import array
+
+from .timestamps import DayClock
+
+# ============================================================
+#   頻出の集計（メモリ一定のストリーミング集計）
+# ============================================================
+#   SpaceSaving  : 上位 capacity 件だけを数える。入りきらない新顔は最小の枠を引き継ぐ
+#   CountMinSketch : 全体の出現回数の見積もり（多めに出ることはあっても少なくはならない）
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, item, weight=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+        else:
+            victim = min(counts, key=counts.get)
+            counts[item] = counts.pop(victim) + weight
+
+
+class CountMinSketch:
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array("I", bytes(4 * width * depth))
+        self.total = 0
+
+    def _slots(self, item):
+        h = hash(item)
+        step = (h >> 32) | 1
+        for i in range(self.depth):
+            yield i * self.width + (h + i * step) % self.width
+
+    def add(self, item, weight=1):
+        table = self.table
+        for slot in self._slots(item):
+            table[slot] += weight
+        self.total += weight
+
+    def estimate(self, item):
+        return min(self.table[slot] for slot in self._slots(item))
+
+
+# ============================================================
+#   いま話題（直近 window 分の発言者・単語）
+# ============================================================
+#   1分ごとの SpaceSaving を window 個のリングで持ち、表示するときだけ足し合わせる。
+#   単語の盛り上がりはセッション全体の CountMinSketch と比べた伸び率で見る。
+HOT_WINDOW = 10
+HOT_CAPACITY = 32
+HOT_CHANNELS = ("叫ぶ", "一般")
+
+# カタカナ・漢字は2文字以上、英字で始まる英数字は3文字以上を1語とする
+_WORD_RE = re.compile(r"[ァ-ヴー]{2,}|[一-龥々]{2,}|[a-z][a-z0-9]{2,}")
+
+
+def hot_words(text):
+    return _WORD_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+class HotTracker:
+    def __init__(self, window=HOT_WINDOW, capacity=HOT_CAPACITY, channels=HOT_CHANNELS):
+        self.window = window
+        self.capacity = capacity
+        self.channels = set(channels)
+        self.clear()
+
+    def clear(self):
+        self.slot_minute = [-1] * self.window
+        self.speakers = [SpaceSaving(self.capacity) for _ in range(self.window)]
+        self.words = [SpaceSaving(self.capacity) for _ in range(self.window)]
+        self.word_totals = [0] * self.window
+        self.baseline = CountMinSketch()
+        self.clock = DayClock()
+
+    def _slot(self, minute):
+        slot = minute % self.window
+        if self.slot_minute[slot] != minute:
+            self.slot_minute[slot] = minute
+            self.speakers[slot] = SpaceSaving(self.capacity)
+            self.words[slot] = SpaceSaving(self.capacity)
+            self.word_totals[slot] = 0
+        return slot
+
+    def add(self, chat_type, speaker, text, secs):
+        if chat_type not in self.channels or secs < 0:
+            return
+        slot = self._slot(self.clock.index(secs) // 60)
+        if speaker:
+            self.speakers[slot].add(speaker)
+        for word in hot_words(text):
+            self.words[slot].add(word)
+            self.word_totals[slot] += 1
+            self.baseline.add(word)
+
+    def _live(self, now_secs):
+        now = self.clock.peek(now_secs) // 60
+        return [
+            slot for slot, minute in enumerate(self.slot_minute)
+            if minute >= 0 and now - self.window < minute <= now
+        ]
+
+    def _merge(self, sketches, live):
+        merged = {}
+        for slot in live:
+            for item, count in sketches[slot].counts.items():
+                merged[item] = merged.get(item, 0) + count
+        return merged
+
+    def top_speakers(self, now_secs, n=10):
+        merged = self._merge(self.speakers, self._live(now_secs))
+        return sorted(merged.items(), key=lambda item: -item[1])[:n]
+
+    def trending_words(self, now_secs, n=10):
+        # (単語, 直近の回数, 全体と比べた伸び率) を 回数 × 伸び率 の順で
+        live = self._live(now_secs)
+        merged = self._merge(self.words, live)
+        recent_total = sum(self.word_totals[slot] for slot in live)
+        if not recent_total or not self.baseline.total:
+            return []
+        rows = []
+        for word, count in merged.items():
+            if count < 2:
+                continue
+            share = count / recent_total
+            base = max(self.baseline.estimate(word), count) / self.baseline.total
+            rows.append((word, count, share / base))
+        rows.sort(key=lambda row: -row[1] * row[2])
+        return rows[:n]
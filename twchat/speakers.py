@@ -0,0 +1,43 @@
+import re
+import sys
+
+# ============================================================
+#   発言者の切り出し
+# ============================================================
+#   名前が付くのは 一般 / 耳打ち / チーム / クラブ / 叫ぶ
+#   本文は "名前 : 発言" の形式（先頭に [To] などの括弧書きが付くことがある）
+SPEAKER_CHANNELS = frozenset(["一般", "耳打ち", "チーム", "クラブ", "叫ぶ"])
+
+_SPEAKER_RE = re.compile(r"^(?:\[[^\]]*\]\s*)?([^\s:：\[\]]{1,24})\s*[:：]\s?(.*)$", re.S)
+
+
+def split_speaker(chat_type, text):
+    if chat_type not in SPEAKER_CHANNELS:
+        return "", text
+    m = _SPEAKER_RE.match(text)
+    if not m:
+        return "", text
+    return sys.intern(m.group(1)), m.group(2)
+
+
+# ============================================================
+#   発言者名の番号付け
+# ============================================================
+class SpeakerTable:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        sid = self.ids.get(name)
+        if sid is None:
+            sid = len(self.names)
+            self.ids[name] = sid
+            self.names.append(name)
+        return sid
+
+    def get(self, name):
+        return self.ids.get(name, -1)
+
+    def __len__(self):
+        return len(self.names)
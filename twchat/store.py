@@ -0,0 +1,201 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+
+from .speakers import SpeakerTable
+from .timestamps import DAY, DayClock, parse_timestamp
+
+# ============================================================
+#   メッセージストア（列ごとに保持）
+# ============================================================
+#   各メッセージには通し番号(seq)を振る。古いものは TRIM 件ずつ捨てるが、
+#   seq は振り直さないので画面側の対応表はそのまま使える。
+#
+#   時刻は 0時からの秒数(times) と、日付をまたいでも単調に増える時刻(index_times)
+#   の2列で持ち、時刻での移動・範囲指定は index_times の二分探索で行う。
+LIMIT = 5000
+TRIM = 100
+
+
+# ============================================================
+#   読み出し（ストア本体とスナップショットで共通）
+# ============================================================
+#   列は base 番から始まり、先頭 len(self) 件が有効。
+#   スナップショットは列を共有したまま件数だけを固定するので、作るのは O(1)。
+class _Rows:
+    def __len__(self):
+        return len(self.index_times)
+
+    def __contains__(self, seq):
+        return self.base <= seq < self.base + len(self)
+
+    def __getitem__(self, seq):
+        i = seq - self.base
+        return self.chat_types[i], self.timestamps[i], self.texts[i]
+
+    def __iter__(self):
+        n = len(self)
+        return islice(zip(self.chat_types, self.timestamps, self.texts), n)
+
+    def seqs(self):
+        return range(self.base, self.base + len(self))
+
+    def repeat_count(self, seq):
+        return self.repeats.get(seq, 1)
+
+    def speaker_of(self, seq):
+        sid = self.speaker_ids[seq - self.base]
+        return self.speakers.names[sid] if sid >= 0 else ""
+
+    def speaker_seqs(self, speaker):
+        sid = self.speakers.get(speaker)
+        if sid < 0:
+            return ()
+        end = self.base + len(self)
+        return tuple(seq for seq in tuple(self.postings.get(sid, ())) if self.base <= seq < end)
+
+    def by_speaker(self, speaker):
+        for seq in self.speaker_seqs(speaker):
+            yield self[seq]
+
+    # ============================================================
+    #   時刻索引
+    # ============================================================
+    def time_of(self, seq):
+        return self.index_times[seq - self.base]
+
+    def clock_to_index(self, secs):
+        # 0時からの秒数を、最新の日付の index_times に換算する
+        n = len(self)
+        t = self.clock_day * DAY + secs
+        if n and t > self.index_times[n - 1] and self.index_times[0] <= t - DAY:
+            t -= DAY
+        return t
+
+    def seq_at_time(self, t):
+        # t 以降の最初のメッセージ番号
+        return self.base + bisect_left(self.index_times, t, 0, len(self))
+
+    def time_range_seqs(self, start, end):
+        n = len(self)
+        lo = bisect_left(self.index_times, start, 0, n)
+        hi = bisect_right(self.index_times, end, 0, n)
+        return range(self.base + lo, self.base + hi)
+
+
+# ============================================================
+#   メッセージストア（書き込みは取り込み側の1スレッドから）
+# ============================================================
+#   古いものを捨てるときは列をその場で詰めず、残す分で作り直して差し替える
+#   （copy-on-write）。差し替え前に取ったスナップショットは古い列を持ち続けるので、
+#   UI・検索・集計はロックなしで、途中で切り詰められることのない一貫した範囲を読める。
+class MessageStore(_Rows):
+    def __init__(self, limit=LIMIT, trim=TRIM):
+        self.limit = limit
+        self.trim = trim
+        self.base = 0
+        self.chat_types = []
+        self.timestamps = []
+        self.texts = []
+        self.speaker_ids = array("i")
+        self.times = array("i")
+        self.index_times = array("q")
+        self.speakers = SpeakerTable()
+        self.postings = {}
+        self.repeats = {}
+        self.clock = DayClock()
+        self._publish()
+
+    @property
+    def clock_day(self):
+        return self.clock.day
+
+    def _publish(self):
+        # スナップショットが参照する列の組を1回の代入で差し替える
+        self._columns = (
+            self.base, self.chat_types, self.timestamps, self.texts, self.speaker_ids,
+            self.times, self.index_times, self.postings, self.repeats,
+        )
+
+    def _index_time(self, secs):
+        if secs < 0:
+            secs = max(self.clock.last_secs, 0)
+        t = self.clock.index(secs)
+        if self.index_times and t < self.index_times[-1]:
+            t = self.index_times[-1]
+        return t
+
+    def append(self, chat_type, timestamp, text, speaker="", secs=None):
+        seq = self.base + len(self.texts)
+        sid = self.speakers.intern(speaker) if speaker else -1
+        if secs is None:
+            secs = parse_timestamp(timestamp)
+
+        # index_times を最後に足す（len() はこの列で数えるので、途中の行は見えない）
+        self.chat_types.append(chat_type)
+        self.timestamps.append(timestamp)
+        self.texts.append(text)
+        self.speaker_ids.append(sid)
+        self.times.append(secs)
+        self.index_times.append(self._index_time(secs))
+        if sid >= 0:
+            self.postings.setdefault(sid, deque()).append(seq)
+
+        if len(self.texts) > self.limit:
+            self._drop(self.trim)
+        return seq
+
+    def _drop(self, n):
+        base = self.base + n
+        postings = dict(self.postings)
+        for sid in set(self.speaker_ids[:n]):
+            if sid < 0:
+                continue
+            plist = deque(seq for seq in postings[sid] if seq >= base)
+            if plist:
+                postings[sid] = plist
+            else:
+                del postings[sid]
+        self.postings = postings
+        self.repeats = {seq: count for seq, count in self.repeats.items() if seq >= base}
+        self.chat_types = self.chat_types[n:]
+        self.timestamps = self.timestamps[n:]
+        self.texts = self.texts[n:]
+        self.speaker_ids = self.speaker_ids[n:]
+        self.times = self.times[n:]
+        self.index_times = self.index_times[n:]
+        self.base = base
+        self._publish()
+
+    def clear(self):
+        self._drop(len(self.texts))
+
+    def snapshot(self):
+        return MessageSnapshot(self)
+
+    def add_repeat(self, seq):
+        # 同じ内容が来た回数（まとめた行の ×N）
+        self.repeats[seq] = self.repeats.get(seq, 1) + 1
+        return self.repeats[seq]
+
+
+# ============================================================
+#   スナップショット（読み出し専用）
+# ============================================================
+#   取った時点の件数までを読む。あとから追記された行は見えず、
+#   切り詰めがあっても古い列を持っているので、その範囲は最後まで読める。
+#   ×N の回数は取り込みに合わせて増えていく（増えた分は描画待ちで書き換える）。
+class MessageSnapshot(_Rows):
+    def __init__(self, store):
+        (self.base, self.chat_types, self.timestamps, self.texts, self.speaker_ids,
+         self.times, self.index_times, self.postings, self.repeats) = store._columns
+        self.count = len(self.index_times)
+        self.speakers = store.speakers
+        self.clock_day = store.clock_day
+
+    def __len__(self):
+        return self.count
+
+    def snapshot(self):
+        return self
@@ -0,0 +1,59 @@
+import re
+
+DAY = 86400
+
+# ============================================================
+#   時刻文字列 → 0時からの秒数
+# ============================================================
+#   チャットログの時刻は "[ 21時 05分 09秒]" の形式
+_TIME_RE = re.compile(r"(\d+)\s*時\s*(\d+)\s*分\s*(\d+)\s*秒|(\d+):(\d+):(\d+)")
+
+
+def parse_timestamp(timestamp):
+    m = _TIME_RE.search(timestamp)
+    if not m:
+        return -1
+    h, mi, s = (int(v) for v in (m.group(1, 2, 3) if m.group(1) else m.group(4, 5, 6)))
+    return h * 3600 + mi * 60 + s
+
+
+# ============================================================
+#   入力欄の時刻 "21:30" / "21:30:15" / "2130" → 秒数
+# ============================================================
+_CLOCK_RE = re.compile(r"^\s*(\d{1,2})(?::|時\s*)?(\d{2})(?:(?::|分\s*)(\d{2})秒?)?分?\s*$")
+
+
+def parse_clock(text):
+    m = _CLOCK_RE.match(text)
+    if not m:
+        return -1
+    h, mi, s = int(m.group(1)), int(m.group(2)), int(m.group(3) or 0)
+    if h > 23 or mi > 59 or s > 59:
+        return -1
+    return h * 3600 + mi * 60 + s
+
+
+def format_clock(secs):
+    return f"{secs // 3600 % 24:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+# ============================================================
+#   日付をまたいでも増え続ける秒数
+# ============================================================
+#   ログの時刻が半日以上巻き戻ったら日付が変わったとみなす
+class DayClock:
+    def __init__(self):
+        self.day = 0
+        self.last_secs = -1
+
+    def peek(self, secs):
+        day = self.day
+        if self.last_secs >= 0 and secs < self.last_secs - DAY // 2:
+            day += 1
+        return day * DAY + secs
+
+    def index(self, secs):
+        t = self.peek(secs)
+        self.day = (t - secs) // DAY
+        self.last_secs = secs
+        return t